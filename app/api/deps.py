@@ -3,12 +3,13 @@ from typing import Generator
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.crud import user as crud
+from app.db.mongo import get_mongo_database
 from app.db.session import SessionLocal
 from app.models import user as models
 from app.schemas import user as schemas
@@ -28,17 +29,12 @@ def get_db() -> Generator:
         db.close()
 
 ## MONGODBの依存関係はここでは定義
-def get_mongo_db() -> Generator:
+async def get_mongo_db() -> AsyncIOMotorDatabase:
     """
-    MongoDBセッションの依存関係
+    MongoDBの依存関係
+    アプリ全体で共有するクライアント（接続プール）のデータベースを返す
     """
-    try:
-        client = AsyncIOMotorClient(settings.MONGODB_URL)
-        mongodb = client[settings.MONGODB_DB_NAME]
-        yield mongodb
-    finally:
-        client.close()
-
+    return get_mongo_database()
 
 
 def get_current_user(
@@ -2,16 +2,21 @@ import gc
 import mimetypes
 import uuid
 from contextlib import asynccontextmanager
+from typing import Tuple
 
 from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
 from fastapi.responses import Response
 
 from app.api import deps
+from app.core.singleflight import SingleFlight
 from app.crud.redis import RedisCacheService
 from app.crud.s3 import StorageService
 
 router = APIRouter()
 
+# 同じ画像のキャッシュミス時のストレージ取得をまとめる
+image_flight = SingleFlight()
+
 def get_file_service() -> StorageService:
     """Fileサービスを取得"""
     try:
@@ -45,6 +50,40 @@ async def managed_image_download(storage: StorageService, file_path: str):
             if gc.get_count()[0] > 700:
                 gc.collect()
 
+async def load_image(
+    storage: StorageService,
+    cache_service: RedisCacheService,
+    file_path: str,
+    use_cache: bool,
+) -> Tuple[bytes, str]:
+    """ストレージから画像を取得し、小さい画像はキャッシュに保存する"""
+    async with managed_image_download(storage, file_path) as contents:
+        if not contents:
+            raise HTTPException(status_code=404, detail="画像が見つかりません")
+
+        # MIMEタイプの推測を改善
+        content_type, _ = mimetypes.guess_type(file_path)
+        if not content_type or not content_type.startswith('image/'):
+            # ファイル拡張子による判定
+            if file_path.lower().endswith(('.jpg', '.jpeg')):
+                content_type = "image/jpeg"
+            elif file_path.lower().endswith('.png'):
+                content_type = "image/png"
+            elif file_path.lower().endswith('.gif'):
+                content_type = "image/gif"
+            elif file_path.lower().endswith('.webp'):
+                content_type = "image/webp"
+            else:
+                content_type = "image/jpeg"  # デフォルト
+        
+        # 小さい画像のみキャッシュに保存
+        if use_cache and len(contents) <= 1024 * 1024 * 5:  # 5MB以下
+            print(f"Caching image {file_path} of size {len(contents)} bytes")
+            await cache_service.cache_image(file_path, contents, content_type)
+
+        # レスポンスデータをコピー（元のcontentsは解放される）
+        return bytes(contents), content_type
+
 # 画像をフロントエンドに表示するためのプロキシーエンドポイント
 @router.get("/images/{file_path:path}")
 async def get_image(
@@ -72,43 +111,21 @@ async def get_image(
                 )
         
         # キャッシュにない場合はストレージから取得（メモリ管理付き）
-        async with managed_image_download(storage, file_path) as contents:
-            if not contents:
-                raise HTTPException(status_code=404, detail="画像が見つかりません")
-
-            # MIMEタイプの推測を改善
-            content_type, _ = mimetypes.guess_type(file_path)
-            if not content_type or not content_type.startswith('image/'):
-                # ファイル拡張子による判定
-                if file_path.lower().endswith(('.jpg', '.jpeg')):
-                    content_type = "image/jpeg"
-                elif file_path.lower().endswith('.png'):
-                    content_type = "image/png"
-                elif file_path.lower().endswith('.gif'):
-                    content_type = "image/gif"
-                elif file_path.lower().endswith('.webp'):
-                    content_type = "image/webp"
-                else:
-                    content_type = "image/jpeg"  # デフォルト
-            
-            # 小さい画像のみキャッシュに保存
-            if use_cache and len(contents) <= 1024 * 1024 * 5:  # 5MB以下
-                print(f"Caching image {file_path} of size {len(contents)} bytes")
-                await cache_service.cache_image(file_path, contents, content_type)
-
-            # レスポンスデータをコピー（元のcontentsは解放される）
-            response_data = bytes(contents)
-            
-            return Response(
-                content=response_data,
-                media_type=content_type,
-                headers={
-                    "X-Cache": "MISS",
-                    "Cache-Control": "public, max-age=3600",
-                    "Content-Length": str(len(response_data))
-                }
-            )
-        
+        # 同じ画像の取得が実行中であれば、その結果を共有する
+        response_data, content_type = await image_flight.do(
+            f"{file_path}:{use_cache}",
+            lambda: load_image(storage, cache_service, file_path, use_cache),
+        )
+
+        return Response(
+            content=response_data,
+            media_type=content_type,
+            headers={
+                "X-Cache": "MISS",
+                "Cache-Control": "public, max-age=3600",
+                "Content-Length": str(len(response_data))
+            }
+        )
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="画像が見つかりません")
     except Exception as e:
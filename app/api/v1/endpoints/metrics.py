@@ -0,0 +1,28 @@
+import secrets
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import Response
+from sqlalchemy.orm import Session
+
+from app.api import deps
+from app.core.config import settings
+from app.core.metrics import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter()
+
+def verify_metrics_access(
+    token: str = Depends(deps.oauth2_scheme),
+    db: Session = Depends(deps.get_db),
+) -> None:
+    """
+    メトリクスはルートや処理時間などの内部情報を含むため、スクレイプ用のトークン（METRICS_TOKEN）か
+    管理者のJWTを持つリクエストにのみ返す
+    """
+    if settings.METRICS_TOKEN and secrets.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return
+    deps.get_current_active_superuser(deps.get_current_user(db, token))
+
+@router.get("/metrics", tags=["metrics"], include_in_schema=False, dependencies=[Depends(verify_metrics_access)])
+def metrics():
+    """Prometheusのテキスト形式でメトリクスを返す（スクレイプ用）"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,35 +1,68 @@
-from typing import Any, List
-
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Awaitable, List, Optional, Tuple
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from sqlalchemy.orm import Session
 
 from app.api import deps
+from app.api.v1.endpoints.file import get_file_service
 from app.core.aws.bedrock_client import BedrockClient
-from app.core.aws.polly_client import PollyClient
+from app.core.aws.polly_client import AsyncPollyClient, polly_client
+from app.core.config import settings
+from app.core.llm.history import pack_history
+from app.core.llm.limiter import tasuki_limiter
+from app.core.llm.registry import llm_registry
+from app.core.singleflight import RedisSingleFlight, SingleFlight
 from app.core.tasuki.tasuki_client import TasukiClient
+from app.core.timing import StageTimer
+from app.crud.analysis_jobs import analysis_jobs
 from app.crud.character import get_character_by_id
-from app.crud.redis import RedisCacheService
+from app.crud.chat_counters import reconcile_all_chat_counters, reconcile_user_chat_counters
+from app.crud.chat_summary import get_chat_summary, refresh_chat_summary
+from app.crud.conversation_analysis import is_after
+from app.crud.redis import RedisCacheService, get_redis_client
 from app.crud.relationship import update_relationship_total_point
+from app.crud.s3 import StorageService
 from app.crud.tasuki import (
     ConversationAnalysisService,
     PositiveAnalysisService,
     TasukiService,
+    analyze_conversation,
     get_all_chat_count,
     get_all_chat_count_by_character,
     get_chat_count,
     get_chat_history,
+    get_chat_messages_page,
+    get_recent_chat_messages,
+    iter_chat_messages,
     save_chat_message,
 )
-from app.schemas.chat import ChatCount, ChatInput, ChatMessage, ChatOutput, ConversationAnalysisChainInput, VoiceReaderInput
+from app.crud.tts_cache import TTSCacheService
+from app.crud.voice import SPECULATIVE_SYNTHESIS, VoiceSynthesisService, get_reply_voice, save_reply_voice
+from app.db.mongo import get_mongo_database
+from app.schemas.chat import ChatCount, ChatInput, ChatMessage, ChatMessagePage, ChatOutput, ChatStreamEvent, ConversationAnalysisChainInput, ConversationAnalysisJob, VoiceReaderInput
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 同一ユーザー・キャラクターの会話分析の同時実行をまとめる（同一テキストの音声合成はVoiceSynthesisServiceでまとめる）
+if settings.SINGLEFLIGHT_BACKEND == "redis":
+    analysis_flight = RedisSingleFlight(get_redis_client, namespace="analysis")
+else:
+    analysis_flight = SingleFlight()
+
 def get_tasuki_client():
     """TASUKIクライアントを取得"""
     try:
-        return TasukiClient()
+        return llm_registry.get_tasuki_client()
     except ValueError:
         raise HTTPException(
             status_code=500, detail="Failed to initialize LLM client. Please check API key configuration."
@@ -38,7 +71,7 @@ def get_tasuki_client():
 def get_bedrock_client() -> BedrockClient:
     """Amazon Bedrockクライアントを取得"""
     try:
-        return BedrockClient()
+        return llm_registry.get_bedrock_client()
     except ValueError:
         raise HTTPException(
             status_code=500, detail="Failed to initialize Amazon Bedrock client. Please check AWS credentials."
@@ -62,15 +95,51 @@ def get_redis_service() -> RedisCacheService:
             status_code=500, detail="Failed to initialize Redis cache service. Please check configuration."
         )
     
-def get_polly_client():
-    """Amazon Polly clientを取得"""
+async def get_polly_client() -> AsyncPollyClient:
+    """Amazon Polly clientを取得（アプリ起動時に作成した共有クライアント）"""
+    return polly_client
+
+def get_tts_cache(storage: StorageService = Depends(get_file_service)) -> TTSCacheService:
+    """音声合成キャッシュサービスを取得"""
+    return TTSCacheService(storage)
+
+def get_voice_synthesizer(
+    polly: AsyncPollyClient = Depends(get_polly_client),
+    tts_cache: TTSCacheService = Depends(get_tts_cache),
+) -> VoiceSynthesisService:
+    """音声合成サービスを取得"""
+    return VoiceSynthesisService(polly, tts_cache)
+
+def get_voice_id(character) -> str:
+    """キャラクターの性別からPollyの音声を決める"""
+    return "Takumi" if character.gender == 0 else "Mizuki"
+
+def should_prefetch_voice(inputs: ChatInput) -> bool:
+    """応答の音声を先行して合成するかどうか（TTS_SPECULATIVE_MODE）"""
+    if settings.TTS_SPECULATIVE_MODE == "always":
+        return True
+    return settings.TTS_SPECULATIVE_MODE == "request" and inputs.prefetch_voice
+
+async def start_speculative_voice(user_id: int, character, text: str) -> Optional[str]:
+    """
+    応答の音声の合成をバックグラウンドで開始し、voice_readerで音声を受け取るためのreply_idを返す
+    合成サービスは先行合成する場合にだけ作成し、作成できない・上限で開始できなかった場合はNoneを返す（チャット自体は失敗させない）
+    """
+    if not text:
+        return None
     try:
-        polly_client = PollyClient()
-        return polly_client.get_client()
-    except ValueError:
-        raise HTTPException(
-            status_code=500, detail="Failed to initialize Amazon Polly client. Please check AWS credentials."
-        )
+        synthesizer = get_voice_synthesizer(await get_polly_client(), get_tts_cache(get_file_service()))
+    except Exception as e:
+        logger.warning(f"先行合成のための音声合成サービスの作成に失敗しました: {e}")
+        return None
+
+    voice = get_voice_id(character)
+    if not synthesizer.speculate(text, voice):
+        return None
+    reply_id = uuid.uuid4().hex
+    if not await save_reply_voice(reply_id, user_id, character.id, voice, text):
+        return None
+    return reply_id
 
 def get_bedrock_service(
     bedrock_client: BedrockClient = Depends(get_bedrock_client)
@@ -102,6 +171,49 @@ def get_conversation_analysis_service(
             status_code=500, detail="Failed to initialize conversation analysis service. Please check API key configuration."
         )
 
+async def resolve_chat_history(
+    inputs: ChatInput, mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int
+) -> Tuple[ChatInput, str, Optional[str]]:
+    """
+    プロンプトに含める会話履歴を決める（use_server_history指定時は保存済みの直近の会話履歴で入力のhistoryを置き換える）
+    履歴は直近CHAT_HISTORY_LIMIT件のうち文字数の予算に収まるだけ新しい方から詰め、収まらない古い会話は保存済みの要約で補う
+    (入力, 要約, 要約の更新が必要な場合はプロンプトに残る最も古いメッセージのtimestamp) を返す
+    """
+    if not inputs.use_server_history:
+        inputs.history, _ = pack_history(inputs.history[-settings.CHAT_HISTORY_LIMIT:], settings.CHAT_HISTORY_CHAR_BUDGET)
+        return inputs, "", None
+
+    # プロンプトから溢れた未要約のメッセージがCHAT_SUMMARY_REFRESH_MIN_MESSAGES件あるかを判定できるだけ多めに取得する
+    refresh_min = settings.CHAT_SUMMARY_REFRESH_MIN_MESSAGES if settings.CHAT_SUMMARY_ENABLED else 0
+    recent, summary_state = await asyncio.gather(
+        get_recent_chat_messages(
+            mongodb,
+            user_id=user_id,
+            character_id=character_id,
+            limit=settings.CHAT_HISTORY_LIMIT + max(refresh_min, 1),
+        ),
+        get_chat_summary(mongodb, user_id, character_id) if settings.CHAT_SUMMARY_ENABLED else asyncio.sleep(0),
+    )
+    overflow, history = recent[:-settings.CHAT_HISTORY_LIMIT], recent[-settings.CHAT_HISTORY_LIMIT:]
+    kept, dropped = pack_history(history, settings.CHAT_HISTORY_CHAR_BUDGET)
+    inputs.history = kept
+    if not settings.CHAT_SUMMARY_ENABLED:
+        return inputs, "", None
+
+    # 要約に取り込まれていない溢れたメッセージが一定数たまった時だけ要約を更新する（毎ターンの更新を避ける）
+    # 未要約のメッセージは溢れたメッセージのうち新しい側に連続するため、取得した範囲で数えればrefresh_min件に達したかを判定できる
+    summary_state = summary_state or {}
+    pending = [
+        msg for msg in overflow + dropped
+        if msg.timestamp and is_after(
+            msg.timestamp, msg.id, summary_state.get("summarized_until"), summary_state.get("summarized_until_id"),
+        )
+    ]
+    refresh_until = None
+    if kept and kept[0].timestamp and pending and len(pending) >= refresh_min:
+        refresh_until = kept[0].timestamp
+    return inputs, summary_state.get("summary", ""), refresh_until
+
 @router.get("/chat/{character_id}", tags=["tasuki"], response_model=List[ChatMessage])
 async def tasuki_chat_history(
     character_id: int,
@@ -111,6 +223,7 @@ async def tasuki_chat_history(
 ) -> List[ChatMessage]:
     """
     TASUKIプロジェクトのチャット履歴を取得するエンドポイント
+    全件を一度に返すため、長い履歴は /chat/{character_id}/messages（ページング）または /messages/export を使う
     """
 
     # キャラクター情報を取得
@@ -129,10 +242,106 @@ async def tasuki_chat_history(
 
     return chat_history  
 
+@router.get("/chat/{character_id}/messages", tags=["tasuki"], response_model=ChatMessagePage)
+async def tasuki_chat_messages(
+    character_id: int,
+    before: Optional[str] = Query(default=None, description="このメッセージIDより古いメッセージを取得する"),
+    after: Optional[str] = Query(default=None, description="このメッセージIDより新しいメッセージを取得する"),
+    limit: int = Query(default=settings.CHAT_HISTORY_PAGE_SIZE, ge=1, le=settings.CHAT_HISTORY_MAX_PAGE_SIZE),
+    db: Session = Depends(deps.get_db),
+    mongodb: AsyncIOMotorDatabase = Depends(deps.get_mongo_db),
+    current_user = Depends(deps.get_current_user)
+) -> ChatMessagePage:
+    """
+    チャット履歴をページングして取得するエンドポイント
+    カーソル未指定時は最新のlimit件、beforeでさらに古いページ、afterで指定したメッセージ以降の新着を取得する
+    """
+    character = get_character_by_id(db, character_id)
+    if not character:
+        raise HTTPException(
+            status_code=404, detail="指定されたキャラクターが見つかりません。"
+        )
+
+    try:
+        messages, has_more = await get_chat_messages_page(
+            mongodb, user_id=current_user.id, character_id=character.id, limit=limit, before=before, after=after,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    next_cursor = None
+    if has_more and messages:
+        next_cursor = messages[-1].id if after else messages[0].id
+    return ChatMessagePage(messages=messages, has_more=has_more, next_cursor=next_cursor)
+
+@router.get("/chat/{character_id}/messages/export", tags=["tasuki"])
+async def tasuki_chat_messages_export(
+    character_id: int,
+    db: Session = Depends(deps.get_db),
+    mongodb: AsyncIOMotorDatabase = Depends(deps.get_mongo_db),
+    current_user = Depends(deps.get_current_user)
+) -> StreamingResponse:
+    """
+    チャット履歴の全件をNDJSON（1行1メッセージ、古い順）でストリーミングするエンドポイント
+    MongoDBのカーソルから少しずつ読みながら送信するため、履歴の長さによらずメモリ使用量は一定
+    """
+    character = get_character_by_id(db, character_id)
+    if not character:
+        raise HTTPException(
+            status_code=404, detail="指定されたキャラクターが見つかりません。"
+        )
+
+    async def export_stream() -> AsyncIterator[str]:
+        async for message in iter_chat_messages(mongodb, user_id=current_user.id, character_id=character.id):
+            yield message.model_dump_json() + "\n"
+
+    return StreamingResponse(
+        export_stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="chat-{character.id}.ndjson"'},
+    )
+
+async def run_side_effect(name: str, awaitable: Awaitable[Any]) -> Any:
+    """
+    チャットの副作用（保存・ポイント更新など）を実行する
+    失敗してもレスポンスを500にはせず、ログに記録してNoneを返す
+    """
+    try:
+        return await awaitable
+    except Exception:
+        logger.exception(f"チャットの副作用の実行に失敗しました: {name}")
+        return None
+
+async def persist_chat_reply(
+    db: Session,
+    mongodb: AsyncIOMotorDatabase,
+    cache_service: RedisCacheService,
+    user_id: int,
+    character_id: int,
+    output: ChatOutput,
+    timer: StageTimer,
+) -> None:
+    """応答メッセージの保存と信頼関係ポイントの更新を並行して実行する（レスポンス送信後に実行）"""
+    await asyncio.gather(
+        run_side_effect("出力メッセージ保存", timer.measure("reply_save", save_chat_message(
+            mongodb,
+            user_id=user_id,
+            character_id=character_id,
+            role=output.role,
+            content=output.response,
+        ), provider="mongo")),
+        run_side_effect("信頼関係ポイント更新", timer.measure("relationship_update", update_relationship_total_point(
+            db, cache_service, user_id=user_id, character_id=character_id,
+            points_to_add=1
+        ), provider="postgres")),
+    )
+
 @router.post("/chat/{character_id}", tags=["tasuki"], response_model=ChatOutput)
 async def tasuki_chat(
     inputs: ChatInput,
     character_id: int,
+    background_tasks: BackgroundTasks,
+    response: Response,
     db: Session = Depends(deps.get_db),
     mongodb: AsyncIOMotorDatabase = Depends(deps.get_mongo_db),
     cache_service: RedisCacheService = Depends(get_redis_service),
@@ -141,54 +350,161 @@ async def tasuki_chat(
 ) -> ChatOutput:
     """
     TASUKIプロジェクトでチャットを実行するエンドポイント
+    LLM呼び出しのみをクリティカルパスとし、入力メッセージの保存はLLM呼び出しと並行して、
+    応答の保存と信頼関係ポイントの更新はレスポンス送信後に実行する
     """
+    timer = StageTimer("chat")
 
     # キャラクター情報を取得
-    character = get_character_by_id(db, character_id)
+    with timer.stage("character_lookup", provider="postgres"):
+        character = get_character_by_id(db, character_id)
     if not character:
         raise HTTPException(
             status_code=404, detail="指定されたキャラクターが見つかりません。"
         )
+    timer.set_character(character)
         
     try:
-        
-        input_result = await save_chat_message(
-            mongodb, 
-            user_id=current_user.id, 
-            character_id=character.id, 
-            role=inputs.role,
-            content=inputs.response,
+        llm_registry.bind_character(character.id, character.tasuki_project_id)
+        tasuki_service = TasukiService(tasuki_client, character.tasuki_project_id)
+
+        # 今回のメッセージを保存する前に履歴を読み込む
+        inputs, summary, refresh_until = await timer.measure(
+            "history", resolve_chat_history(inputs, mongodb, current_user.id, character.id), provider="mongo",
         )
 
-        print(f"入力メッセージ保存結果: {input_result}")
+        output, _ = await asyncio.gather(
+            timer.measure("llm", tasuki_service.chat(inputs, character, summary=summary), provider="tasuki"),
+            run_side_effect("入力メッセージ保存", timer.measure("input_save", save_chat_message(
+                mongodb, 
+                user_id=current_user.id, 
+                character_id=character.id, 
+                role=inputs.role,
+                content=inputs.response,
+            ), provider="mongo")),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"TASUKIチャットに失敗しました: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"TASUKIチャットに失敗しました。{str(e)}"
+        )
 
-        tasuki_service = TasukiService(tasuki_client, character.tasuki_project_id)
+    # 応答が確定した時点で音声の合成を始めておき、続くvoice_readerの待ち時間を短くする
+    if should_prefetch_voice(inputs):
+        output.reply_id = await start_speculative_voice(current_user.id, character, output.response)
 
-        output = await tasuki_service.chat(inputs, character)
+    background_tasks.add_task(
+        persist_chat_reply, db, mongodb, cache_service,
+        user_id=current_user.id, character_id=character.id, output=output, timer=timer,
+    )
+    if refresh_until:
+        background_tasks.add_task(refresh_chat_summary, mongodb, current_user.id, character.id, refresh_until)
+    timer.apply(response)
+    return output
 
-        output_result = await save_chat_message(
-            mongodb, 
-            user_id=current_user.id, 
-            character_id=character.id, 
-            role=output.role,
-            content=output.response,
+@router.post("/chat/{character_id}/stream", tags=["tasuki"])
+async def tasuki_chat_stream(
+    inputs: ChatInput,
+    character_id: int,
+    db: Session = Depends(deps.get_db),
+    mongodb: AsyncIOMotorDatabase = Depends(deps.get_mongo_db),
+    cache_service: RedisCacheService = Depends(get_redis_service),
+    tasuki_client: TasukiClient = Depends(get_tasuki_client),
+    current_user = Depends(deps.get_current_user)
+) -> StreamingResponse:
+    """
+    TASUKIプロジェクトでチャットをストリーミング実行するエンドポイント
+    1行1イベントのNDJSON（application/x-ndjson）で delta -> done の順に返す
+    ストリーム終了後に応答全体を保存し、信頼関係ポイントを更新する
+    """
+    timer = StageTimer("chat_stream")
+
+    # キャラクター情報を取得
+    with timer.stage("character_lookup", provider="postgres"):
+        character = get_character_by_id(db, character_id)
+    if not character:
+        raise HTTPException(
+            status_code=404, detail="指定されたキャラクターが見つかりません。"
         )
+    timer.set_character(character)
 
-        print(f"出力メッセージ保存結果: {output_result}")
+    try:
+        llm_registry.bind_character(character.id, character.tasuki_project_id)
+        tasuki_service = TasukiService(tasuki_client, character.tasuki_project_id)
 
-        updated_relationship = await update_relationship_total_point(
-            db, cache_service, user_id=current_user.id, character_id=character.id,
-            points_to_add=1
+        # 今回のメッセージを保存する前に履歴を読み込む
+        inputs, summary, refresh_until = await timer.measure(
+            "history", resolve_chat_history(inputs, mongodb, current_user.id, character.id), provider="mongo",
         )
-        print(f"更新された信頼関係: {updated_relationship}")
-
-        return output
     except Exception as e:
-        print(f"TASUKIチャットに失敗しました: {e}")
+        logger.exception(f"TASUKIチャットに失敗しました: {e}")
         raise HTTPException(
             status_code=500, detail=f"TASUKIチャットに失敗しました。{str(e)}"
         )
 
+    # レスポンスヘッダーを送る前にTASUKIの実行枠を確保し、混雑時は503（Retry-After付き）を返す
+    # 確保した枠はストリームを読み終えた時点で解放する
+    llm_slot = AsyncExitStack()
+    await timer.measure("llm_queue", llm_slot.enter_async_context(tasuki_limiter.slot()), provider="tasuki")
+
+    completed: List[ChatOutput] = []
+
+    async def event_stream() -> AsyncIterator[str]:
+        # 入力メッセージの保存はトークンの受信と並行して実行する
+        save_input = asyncio.create_task(run_side_effect("入力メッセージ保存", timer.measure("input_save", save_chat_message(
+            mongodb,
+            user_id=current_user.id,
+            character_id=character.id,
+            role=inputs.role,
+            content=inputs.response,
+        ), provider="mongo")))
+        started = time.perf_counter()
+        first_token = True
+        try:
+            with tasuki_limiter.held():
+                async for event in tasuki_service.chat_stream(inputs, character, summary=summary):
+                    if first_token:
+                        timer.record("llm_first_token", time.perf_counter() - started, provider="tasuki")
+                        first_token = False
+                    if event.type == "done":
+                        timer.record("llm", time.perf_counter() - started, provider="tasuki")
+                        if should_prefetch_voice(inputs):
+                            event.reply_id = await start_speculative_voice(current_user.id, character, event.response)
+                        completed.append(ChatOutput(role=event.role, response=event.response, chunks=event.chunks, reply_id=event.reply_id))
+                    yield event.model_dump_json(exclude_none=True) + "\n"
+        except Exception as e:
+            logger.exception(f"TASUKIチャット（ストリーミング）に失敗しました: {e}")
+            detail = e.detail if isinstance(e, HTTPException) else f"TASUKIチャットに失敗しました。{str(e)}"
+            error = ChatStreamEvent(type="error", message=detail)
+            yield error.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            await llm_slot.aclose()
+            await save_input
+
+    async def persist_completed_reply() -> None:
+        if completed:
+            await persist_chat_reply(
+                db, mongodb, cache_service,
+                user_id=current_user.id, character_id=character.id, output=completed[0], timer=timer,
+            )
+
+    background_tasks = BackgroundTasks()
+    background_tasks.add_task(persist_completed_reply)
+    if refresh_until:
+        background_tasks.add_task(refresh_chat_summary, mongodb, current_user.id, character.id, refresh_until)
+
+    # ストリーム開始前に計測済みの段階（キャラクター取得・履歴読み込み）のみをヘッダーに含める
+    response = StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
+    timer.apply(response)
+    return response
+
 @router.get("/chat/count/all", tags=["tasuki"], response_model=int)
 async def tasuki_chat_count(
     mongodb: AsyncIOMotorDatabase = Depends(deps.get_mongo_db),
@@ -199,7 +515,7 @@ async def tasuki_chat_count(
     """
     try:
         count = await get_all_chat_count(mongodb, user_id=current_user.id)
-        print(f"ユーザーのチャット履歴件数: {count}")
+        logger.debug(f"ユーザーのチャット履歴件数: {count}")
         return count
     except Exception as e:
         raise HTTPException(
@@ -239,62 +555,88 @@ async def tasuki_chat_count_all_by_characters(
             status_code=500, detail=f"全キャラクターのチャット履歴件数取得に失敗しました。{str(e)}"
         )
     
+@router.post("/chat/count/reconcile", tags=["tasuki"], status_code=202)
+async def tasuki_chat_count_reconcile(
+    background_tasks: BackgroundTasks,
+    user_id: Optional[int] = Query(default=None, description="指定したユーザーのみ再集計する"),
+    mongodb: AsyncIOMotorDatabase = Depends(deps.get_mongo_db),
+    current_user = Depends(deps.get_current_active_superuser)
+) -> dict:
+    """
+    チャットのカウンターをchatsコレクションから再集計するエンドポイント（管理者用）
+    user_idを省略した場合は全ユーザーをバックグラウンドで再集計する
+    """
+    if user_id is not None:
+        await reconcile_user_chat_counters(mongodb, user_id)
+        return {"status": "completed", "user_id": user_id}
+    background_tasks.add_task(reconcile_all_chat_counters, mongodb)
+    return {"status": "accepted"}
+
 @router.post("/chat/{character_id}/voice_reader", tags=["tasuki"])
-def tasuki_voice_reader(
+async def tasuki_voice_reader(
     input: VoiceReaderInput, 
     character_id: int,
-    polly_client = Depends(get_polly_client),
+    synthesizer: VoiceSynthesisService = Depends(get_voice_synthesizer),
     db: Session = Depends(deps.get_db),
     current_user = Depends(deps.get_current_user)
-) -> StreamingResponse:
+) -> Response:
+    timer = StageTimer("voice_reader")
 
-    character = get_character_by_id(db, character_id)
+    # SQLAlchemyの同期セッションのため、イベントループを止めないようスレッドプールで取得する
+    character = await timer.measure(
+        "character_lookup", run_in_threadpool(get_character_by_id, db, character_id), provider="postgres",
+    )
 
     if not character:
         raise HTTPException(
             status_code=404, detail="指定されたキャラクターが見つかりません。"
         )
+    timer.set_character(character)
     
-    if not input.text:
+    text, voice = input.text, get_voice_id(character)
+
+    # チャットの応答で先行合成を開始した音声であれば、そのテキスト・音声で合成済み（または合成中）の音声を返す
+    if input.reply_id:
+        reply = await get_reply_voice(input.reply_id)
+        if reply and reply["user_id"] == current_user.id and reply["character_id"] == character.id:
+            text, voice = reply["text"], reply["voice"]
+            SPECULATIVE_SYNTHESIS.labels(result="used").inc()
+
+    if not text:
         raise HTTPException(
             status_code=400, detail="音声化するテキストが指定されていません。"
         )
-    
-    gender = character.gender
 
-    if gender == 0:
-        voice = "Takumi"
-    elif gender == 1:
-        voice = "Mizuki"
+    headers = {"Content-Disposition": "inline; filename=voice.mp3"}
 
     try:
-        # Amazon Pollyを使用して音声を生成
-        response = polly_client.synthesize_speech(
-            Text=input.text,
-            OutputFormat='mp3',
-            VoiceId=voice,
-            LanguageCode='ja-JP'
-        )
-
-        audio_stream = response.get("AudioStream")
-        if not audio_stream:
-            raise HTTPException(
-                status_code=500, detail="音声の生成に失敗しました。"
-            )
-        return StreamingResponse(
-            audio_stream,
-            media_type="audio/mpeg",
-            headers={"Content-Disposition": "inline; filename=voice.mp3"}
+        # キャッシュ済みの音声があればPollyを呼び出さずに返し、なければ合成しながら届いた分から返す
+        # （文ごとのパイプラインが有効な場合は、文ごとに並行して合成し、最初の文ができた時点で返し始める）
+        audio = await synthesizer.synthesize(text, voice)
+        first_chunk = await timer.measure("first_chunk", audio.__anext__(), provider="polly")
+    except StopAsyncIteration:
+        raise HTTPException(
+            status_code=500, detail="音声の生成に失敗しました。"
         )
     except Exception as e:
-        print(f"音声生成に失敗しました: {e}")
+        logger.exception(f"音声生成に失敗しました: {e}")
         raise HTTPException(
             status_code=500, detail=f"音声生成に失敗しました。{str(e)}"
         )
+
+    async def audio_stream() -> AsyncIterator[bytes]:
+        yield first_chunk
+        async for chunk in audio:
+            yield chunk
+
+    response = StreamingResponse(audio_stream(), media_type="audio/mpeg", headers=headers)
+    timer.apply(response)
+    return response
     
 @router.get("/chat/conversation_analysis/{character_id}", tags=["tasuki"])
 async def tasuki_conversation_analysis(
     character_id: int,
+    response: Response,
     bedrock_service: PositiveAnalysisService = Depends(get_bedrock_service),
     conversation_analysis: ConversationAnalysisService = Depends(get_conversation_analysis_service),
     db: Session = Depends(deps.get_db),
@@ -303,34 +645,91 @@ async def tasuki_conversation_analysis(
 ) -> Any:
     """
     会話分析を実行するエンドポイント
+    未分析のメッセージがCONVERSATION_ANALYSIS_MAX_BATCHES回で取り込みきれない場合は、途中までの結果をstale=Trueで返す
+    （続きは次回のリクエストか、未分析のメッセージを全て取り込む分析ジョブで反映する）
     """
+    timer = StageTimer("conversation_analysis")
 
     inputs = ConversationAnalysisChainInput(
         user_id=current_user.id,
         character_id=character_id
     )
 
+    async def run_analysis() -> dict:
+        return await analyze_conversation(
+            mongodb, conversation_analysis, bedrock_service, inputs.user_id, inputs.character_id, timer=timer,
+            max_batches=settings.CONVERSATION_ANALYSIS_MAX_BATCHES,
+        )
+
     try:
-        conversation_analysis_result = await conversation_analysis.check(
-            inputs=inputs, 
-            db=db,
-            mongodb=mongodb
+        # 同じユーザー・キャラクターの分析が実行中であれば、その結果を共有する
+        with timer.stage("analysis"):
+            result = await analysis_flight.do(f"{inputs.user_id}:{inputs.character_id}", run_analysis)
+        timer.apply(response)
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"会話分析に失敗しました: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"会話分析に失敗しました。{str(e)}"
         )
 
-        positive = await bedrock_service.check(
-            inputs=inputs,
-            db=db,
-            mongodb=mongodb
+@router.post("/chat/conversation_analysis/{character_id}/jobs", tags=["tasuki"], response_model=ConversationAnalysisJob, status_code=202)
+async def tasuki_conversation_analysis_job(
+    character_id: int,
+    bedrock_service: PositiveAnalysisService = Depends(get_bedrock_service),
+    conversation_analysis: ConversationAnalysisService = Depends(get_conversation_analysis_service),
+    current_user = Depends(deps.get_current_user),
+) -> Any:
+    """
+    会話分析をジョブとして登録するエンドポイント
+    分析の完了を待たずにジョブIDを返すため、結果は GET /chat/conversation_analysis/jobs/{job_id} で取得する
+    """
+    user_id = current_user.id
+    # ジョブはレスポンス送信後に実行されるため、リクエスト単位ではなく共有のMongoDBクライアントを使う
+    mongodb = get_mongo_database()
+
+    async def run_analysis() -> dict:
+        return await analysis_flight.do(
+            f"{user_id}:{character_id}",
+            lambda: analyze_conversation(
+                mongodb, conversation_analysis, bedrock_service, user_id, character_id,
+                timer=StageTimer("conversation_analysis_job"),
+            ),
         )
 
-        return {
-            "conversation_analysis": conversation_analysis_result,
-            "positive_analysis": positive
-        }
-        
+    try:
+        return await analysis_jobs.submit(user_id, character_id, run_analysis)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"会話分析に失敗しました: {e}")
+        logger.exception(f"会話分析ジョブの登録に失敗しました: {e}")
         raise HTTPException(
-            status_code=500, detail=f"会話分析に失敗しました。{str(e)}"
+            status_code=500, detail=f"会話分析ジョブの登録に失敗しました。{str(e)}"
+        )
+
+@router.get("/chat/conversation_analysis/jobs/{job_id}", tags=["tasuki"], response_model=ConversationAnalysisJob)
+async def tasuki_conversation_analysis_job_status(
+    job_id: str,
+    wait: float = Query(default=0, ge=0, le=30, description="ジョブが終了するまで最大何秒待つか（ロングポーリング）"),
+    current_user = Depends(deps.get_current_user),
+) -> Any:
+    """
+    会話分析ジョブの状態と結果を取得するエンドポイント
+    waitを指定した場合は、ジョブが終了するかwait秒経過するまで待ってから返す
+    """
+    try:
+        job = await analysis_jobs.wait(job_id, timeout=wait) if wait else await analysis_jobs.get(job_id)
+    except Exception as e:
+        logger.exception(f"会話分析ジョブの取得に失敗しました: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"会話分析ジョブの取得に失敗しました。{str(e)}"
+        )
+
+    if job is None or job["user_id"] != current_user.id:
+        raise HTTPException(
+            status_code=404, detail="指定された会話分析ジョブが見つかりません。"
         )
-    
\ No newline at end of file
+    return job
@@ -1,21 +1,39 @@
+from typing import AsyncIterator, Optional
+
 from fastapi import HTTPException
 from langchain_aws.chat_models.bedrock import ChatBedrock
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
 
 from app.core.config import settings
+from app.core.llm.limiter import bedrock_limiter
+
+
+class LimitedChatBedrock(ChatBedrock):
+    """非同期呼び出しをBedrockの同時実行数の制限の内側で実行するChatBedrock"""
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        async with bedrock_limiter.slot():
+            return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        async with bedrock_limiter.slot():
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
 
 
 class BedrockClient:
     """Amazon Bedrockクライアント"""
 
-    def __init__(self):
+    def __init__(self, model_id: Optional[str] = None):
+        self.model_id = model_id or settings.AWS_BEDROCK_MODEL_ID
         self.client = self._initialize_client()
 
     def _initialize_client(self) -> BaseChatModel:
         """Amazon Bedrockクライアントを初期化"""
         try:
-            return ChatBedrock(
-                model_id=settings.AWS_BEDROCK_MODEL_ID,
+            return LimitedChatBedrock(
+                model_id=self.model_id,
                 region_name='ap-northeast-1',  # 東京リージョン
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID_BEDROCK,
                 aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY_BEDROCK
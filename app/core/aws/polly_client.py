@@ -1,30 +1,73 @@
-import boto3
-from fastapi import HTTPException
-from langchain_core.language_models.chat_models import BaseChatModel
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Optional
+
+import aioboto3
+from botocore.config import Config
 
 from app.core.config import settings
 
 
-class PollyClient:
-    """Amazon Pollyクライアント"""
+class AsyncPollyClient:
+    """
+    Amazon Pollyの非同期クライアント（aioboto3）
+    アプリ起動時に1つだけ作成して接続プールを使い回し、合成した音声をPollyから受け取った順にチャンクで返す
+    """
 
     def __init__(self):
-        self.client = self._initialize_client()
-
-    def _initialize_client(self):
-        """Amazon Pollyクライアントを初期化"""
-        try:
-            return boto3.client(
-                'polly',
-                region_name='ap-northeast-1',  # 東京リージョン
+        self._client: Optional[Any] = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """クライアントを作成（アプリ起動時に呼び出す）"""
+        async with self._lock:
+            if self._client is not None:
+                return
+            session = aioboto3.Session(
                 aws_access_key_id=settings.AWS_ACCESS_KEY_ID_POLLY,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY_POLLY
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Failed to initialize Amazon Polly service: {str(e)}"
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY_POLLY,
+                region_name=settings.AWS_REGION,
             )
+            exit_stack = AsyncExitStack()
+            self._client = await exit_stack.enter_async_context(session.client(
+                "polly",
+                config=Config(max_pool_connections=settings.POLLY_MAX_POOL_CONNECTIONS),
+            ))
+            self._exit_stack = exit_stack
+
+    async def close(self) -> None:
+        """クライアントを閉じる（アプリ終了時に呼び出す）"""
+        async with self._lock:
+            if self._exit_stack is not None:
+                await self._exit_stack.aclose()
+            self._client = None
+            self._exit_stack = None
+
+    async def synthesize_stream(
+        self,
+        text: str,
+        voice_id: str,
+        output_format: str = "mp3",
+        language_code: str = "ja-JP",
+        chunk_size: int = settings.POLLY_STREAM_CHUNK_SIZE,
+    ) -> AsyncIterator[bytes]:
+        """音声を合成し、Pollyから届いた分からchunk_sizeずつ返す"""
+        if self._client is None:
+            # スクリプト実行時などライフサイクル外で呼ばれた場合
+            await self.start()
+        response = await self._client.synthesize_speech(
+            Text=text,
+            OutputFormat=output_format,
+            VoiceId=voice_id,
+            LanguageCode=language_code,
+        )
+        async with response["AudioStream"] as stream:
+            while True:
+                chunk = await stream.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
 
-    def get_client(self) -> BaseChatModel:
-        """Pollyクライアントを取得"""
-        return self.client
\ No newline at end of file
+polly_client = AsyncPollyClient()
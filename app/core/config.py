@@ -20,6 +20,9 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 24))  # 1日
 
+    # メトリクス（/metrics はこのトークンまたは管理者のJWTを Authorization: Bearer で送った場合のみ返す）
+    METRICS_TOKEN: Optional[str] = os.getenv("METRICS_TOKEN")
+
     # OAuth設定
     GITHUB_CLIENT_ID: Optional[str] = os.getenv("GITHUB_CLIENT_ID")
     GITHUB_CLIENT_SECRET: Optional[str] = os.getenv("GITHUB_CLIENT_SECRET")
@@ -40,6 +43,14 @@ class Settings(BaseSettings):
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_IMAGE_CACHE_TTL: int = 3600  # 1時間
     REDIS_MAX_IMAGE_SIZE: int = 1024 * 1024 * 5  # 最大5MB
+    SINGLEFLIGHT_BACKEND: str = os.getenv("SINGLEFLIGHT_BACKEND", "local")  # local: プロセス内 / redis: 複数Pod間で共有
+    ANALYSIS_CACHE_TTL: int = int(os.getenv("ANALYSIS_CACHE_TTL", 60 * 60 * 24))  # 会話分析結果のキャッシュ期間（1日）
+    TTS_CACHE_ENABLED: bool = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"  # 合成済みの音声を再利用する
+    TTS_CACHE_REDIS_MAX_BYTES: int = int(os.getenv("TTS_CACHE_REDIS_MAX_BYTES", 256 * 1024))  # これ以下の音声はRedisにも保存する
+    TTS_CACHE_MAX_BYTES: int = int(os.getenv("TTS_CACHE_MAX_BYTES", 5 * 1024 * 1024))  # これを超える音声はキャッシュしない
+    TTS_CACHE_REDIS_TTL: int = int(os.getenv("TTS_CACHE_REDIS_TTL", 60 * 60 * 24))  # Redisに保存する期間（1日）
+    TTS_CACHE_INDEX_TTL: int = int(os.getenv("TTS_CACHE_INDEX_TTL", 60 * 60 * 24 * 30))  # S3に保存済みであることを覚えておく期間（30日）
+    TTS_CACHE_S3_PREFIX: str = os.getenv("TTS_CACHE_S3_PREFIX", "tts-cache")
 
     # S3/MinIO設定
     S3_ENDPOINT_URL: Optional[str] = os.getenv("S3_ENDPOINT_URL")  # MinIO用、AWS S3の場合はNone
@@ -52,6 +63,13 @@ class Settings(BaseSettings):
     AWS_REGION: str = os.getenv("AWS_REGION", "ap-northeast-1")  # 東京リージョン
     AWS_ACCESS_KEY_ID_POLLY: str = os.getenv("AWS_ACCESS_KEY_ID_POLLY")
     AWS_SECRET_ACCESS_KEY_POLLY: str = os.getenv("AWS_SECRET_ACCESS_KEY_POLLY")
+    POLLY_MAX_POOL_CONNECTIONS: int = int(os.getenv("POLLY_MAX_POOL_CONNECTIONS", 50))
+    POLLY_STREAM_CHUNK_SIZE: int = int(os.getenv("POLLY_STREAM_CHUNK_SIZE", 8 * 1024))  # 音声をクライアントへ送る単位（バイト）
+    TTS_SENTENCE_PIPELINE_ENABLED: bool = os.getenv("TTS_SENTENCE_PIPELINE_ENABLED", "true").lower() == "true"  # 文ごとに分割して合成する
+    TTS_SENTENCE_CONCURRENCY: int = int(os.getenv("TTS_SENTENCE_CONCURRENCY", 3))  # 1リクエストで並行して合成する文の数
+    TTS_SPECULATIVE_MODE: str = os.getenv("TTS_SPECULATIVE_MODE", "request")  # off / request（prefetch_voice指定時のみ） / always
+    TTS_SPECULATIVE_MAX_PENDING: int = int(os.getenv("TTS_SPECULATIVE_MAX_PENDING", 32))  # 同時に実行する先行合成の上限（超えた分は行わない）
+    TTS_REPLY_TTL: int = int(os.getenv("TTS_REPLY_TTL", 600))  # reply_idから応答のテキストを引けるようにしておく期間（秒）
     
     # Amazon Bedrock設定
     AWS_BEDROCK_MODEL_ID: str = os.getenv("AWS_BEDROCK_MODEL_ID", "apac.amazon.nova-pro-v1:0")
@@ -64,6 +82,55 @@ class Settings(BaseSettings):
     # TASUKI
     TASUKI_API_URL: str = os.getenv("TASUKI_API_URL", "https://api.tasuki.io/api/v1")
     TASUKI_API_KEY: str = os.getenv("TASUKI_API_KEY")
+    TASUKI_HTTP_MAX_CONNECTIONS: int = int(os.getenv("TASUKI_HTTP_MAX_CONNECTIONS", 100))
+    TASUKI_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("TASUKI_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+    TASUKI_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("TASUKI_HTTP_KEEPALIVE_EXPIRY", 30.0))  # 秒
+    TASUKI_HTTP_TIMEOUT: float = float(os.getenv("TASUKI_HTTP_TIMEOUT", 20.0))  # 1回の試行・ストリームの受信待ちの上限（秒。TASUKI_CALL_DEADLINEより短くする）
+    TASUKI_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("TASUKI_HTTP_CONNECT_TIMEOUT", 5.0))  # 秒
+    TASUKI_CALL_DEADLINE: float = float(os.getenv("TASUKI_CALL_DEADLINE", 30.0))  # リトライ・ヘッジを含む1回の呼び出しの期限（秒）
+    TASUKI_RETRY_MAX_ATTEMPTS: int = int(os.getenv("TASUKI_RETRY_MAX_ATTEMPTS", 3))
+    TASUKI_RETRY_BASE_DELAY: float = float(os.getenv("TASUKI_RETRY_BASE_DELAY", 0.2))  # 秒
+    TASUKI_RETRY_MAX_DELAY: float = float(os.getenv("TASUKI_RETRY_MAX_DELAY", 2.0))  # 秒
+    TASUKI_HEDGE_ENABLED: bool = os.getenv("TASUKI_HEDGE_ENABLED", "false").lower() == "true"
+    TASUKI_HEDGE_DELAY: float = float(os.getenv("TASUKI_HEDGE_DELAY", 3.0))  # p95が計算できるまでのヘッジ待ち時間（秒）
+    TASUKI_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("TASUKI_BREAKER_FAILURE_THRESHOLD", 5))  # 連続失敗数
+    TASUKI_BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv("TASUKI_BREAKER_RECOVERY_TIMEOUT", 30.0))  # 秒
+
+    # レスポンスに処理段階ごとの所要時間（Server-Timingヘッダー）を含める（デバッグ用）
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
+
+    # LLMプロバイダー（tasuki: TASUKI/Bedrockを呼び出す / fake: ローカル開発・負荷試験用の偽のモデルを使う）
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "tasuki")
+    FAKE_LLM_LATENCY: float = float(os.getenv("FAKE_LLM_LATENCY", 0.0))  # 偽のモデルの応答時間（秒）
+
+    # LLM呼び出しの同時実行数の制限（プロバイダーごと）
+    TASUKI_MAX_CONCURRENCY: int = int(os.getenv("TASUKI_MAX_CONCURRENCY", 32))
+    TASUKI_MAX_QUEUE: int = int(os.getenv("TASUKI_MAX_QUEUE", 64))  # 実行枠の空きを待てる最大数
+    BEDROCK_MAX_CONCURRENCY: int = int(os.getenv("BEDROCK_MAX_CONCURRENCY", 16))
+    BEDROCK_MAX_QUEUE: int = int(os.getenv("BEDROCK_MAX_QUEUE", 32))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", 10.0))  # 秒
+    LLM_RETRY_AFTER: int = int(os.getenv("LLM_RETRY_AFTER", 2))  # 過負荷時に返すRetry-After（秒）
+
+    # チャット設定
+    CHAT_HISTORY_LIMIT: int = int(os.getenv("CHAT_HISTORY_LIMIT", 20))  # プロンプトに含める会話履歴の最大件数
+    CHAT_HISTORY_PAGE_SIZE: int = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", 50))  # チャット履歴のページングの既定の件数
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = int(os.getenv("CHAT_HISTORY_MAX_PAGE_SIZE", 200))
+    CHAT_HISTORY_CHAR_BUDGET: int = int(os.getenv("CHAT_HISTORY_CHAR_BUDGET", 4000))  # プロンプトに含める会話履歴の文字数の上限
+    CHAT_SUMMARY_ENABLED: bool = os.getenv("CHAT_SUMMARY_ENABLED", "true").lower() == "true"  # 予算から溢れた会話を要約する
+    CHAT_SUMMARY_MAX_MESSAGES: int = int(os.getenv("CHAT_SUMMARY_MAX_MESSAGES", 100))  # 要約に1回で畳み込む最大メッセージ数（超える分は古い順に分けて畳み込む）
+    CHAT_SUMMARY_REFRESH_MIN_MESSAGES: int = int(os.getenv("CHAT_SUMMARY_REFRESH_MIN_MESSAGES", 10))  # 未要約の溢れたメッセージがこの件数に達したら要約を更新する
+    CONVERSATION_ANALYSIS_WINDOW: int = int(os.getenv("CONVERSATION_ANALYSIS_WINDOW", 10))  # 会話分析の対象とする直近のメッセージ数
+    CONVERSATION_ANALYSIS_MAX_BATCHES: int = int(os.getenv("CONVERSATION_ANALYSIS_MAX_BATCHES", 1))  # 会話分析のリクエスト1回で未分析のメッセージを分析する最大回数（残りは次回以降か分析ジョブで分析）
+    CHAT_RECENT_BUFFER_ENABLED: bool = os.getenv("CHAT_RECENT_BUFFER_ENABLED", "true").lower() == "true"  # 直近のメッセージをRedisに保持する
+    CHAT_RECENT_BUFFER_SIZE: int = int(os.getenv("CHAT_RECENT_BUFFER_SIZE", 50))  # 会話ごとにRedisに保持する直近のメッセージ数
+    CHAT_RECENT_BUFFER_TTL: int = int(os.getenv("CHAT_RECENT_BUFFER_TTL", 86400))  # 秒
+    CHAT_WRITE_MODE: str = os.getenv("CHAT_WRITE_MODE", "acknowledged")  # direct / acknowledged / write_behind
+    CHAT_WRITE_BATCH_SIZE: int = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 100))
+    CHAT_WRITE_FLUSH_INTERVAL: float = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", 0.02))  # 秒
+    CHAT_WRITE_MAX_QUEUE_SIZE: int = int(os.getenv("CHAT_WRITE_MAX_QUEUE_SIZE", 10000))
+    ANALYSIS_JOB_WORKERS: int = int(os.getenv("ANALYSIS_JOB_WORKERS", 4))  # 会話分析ジョブを処理するワーカー数
+    ANALYSIS_JOB_MAX_QUEUE_SIZE: int = int(os.getenv("ANALYSIS_JOB_MAX_QUEUE_SIZE", 1000))
+    ANALYSIS_JOB_TTL: int = int(os.getenv("ANALYSIS_JOB_TTL", 3600))  # ジョブの状態をRedisに保持する期間（秒）
 
     # MongoDB設定
     MONGODB_URL: Optional[str] = None
@@ -71,6 +138,13 @@ class Settings(BaseSettings):
     MONGODB_USERNAME: Optional[str] = os.getenv("MONGODB_USERNAME", "mongdb")
     MONGODB_PASSWORD: Optional[str] = os.getenv("MONGODB_PASSWORD", "mongdb")
     MONGODB_DB_NAME: Optional[str] = os.getenv("MONGODB_DB_NAME", "ht-sb")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", 100))  # サーバーごとの接続数の上限
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", 5))  # 常に維持する接続数
+    MONGODB_MAX_IDLE_TIME_MS: int = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", 300000))  # 未使用の接続を閉じるまでの時間
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 5000))  # プールが空いたときに接続を待つ時間
+    MONGODB_CONNECT_TIMEOUT_MS: int = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 5000))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGODB_SOCKET_TIMEOUT_MS: int = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", 30000))
     
     def __init__(self, **data: Any):
         super().__init__(**data)
@@ -1,17 +1,17 @@
 import json
 import logging
 import re
+from typing import AsyncIterator, List
 
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessageChunk
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_core.runnables import RunnableLambda
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from sqlalchemy.orm import Session
 
 from app.core.llm.chain.base import BaseChain
 from app.core.llm.chain.jschema import SCHEMA_CNVERSATION_ANALYSIS, SCHEMA_POSITIVE_ANALYSIS
-from app.schemas.chat import ChatInput, ChatMessage, ChatOutput, ConversationAnalysisChainInput
+from app.schemas.chat import ChatInput, ChatMessage, ChatOutput
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +24,9 @@ class ChatChain(BaseChain):
         self.prompt = PromptTemplate(
             template="""あなたはこれから以下の内容の人になりきってください。
 
+これまでの会話の要約:
+{summary}
+
 会話履歴:
 {history}
 
@@ -49,6 +52,7 @@ class ChatChain(BaseChain):
                 "role", 
                 "response", 
                 "history", 
+                "summary",
                 "character_name",
                 "character_age",
                 "character_personality",
@@ -71,6 +75,7 @@ class ChatChain(BaseChain):
             "role": inputs.role,
             "response": inputs.response,
             "history": history_text,
+            "summary": kwargs.pop("summary", "") or "なし",
             "character_name": character.name,
             "character_age": character.age,
             "character_personality": ', '.join(character.personality or []),
@@ -81,19 +86,32 @@ class ChatChain(BaseChain):
 
         return self.prompt.invoke(formatted_input, **kwargs).to_string()
 
-    def invoke(self, inputs: ChatInput, character, **kwargs) -> ChatOutput:
+    def invoke(self, inputs: ChatInput, character, summary: str = "", **kwargs) -> ChatOutput:
         """Invoke the chain with history formatting."""
-        # Format history
+        return self.chain.invoke(self._format_input(inputs, character, summary), **kwargs)
+
+    async def ainvoke(self, inputs: ChatInput, character, summary: str = "", **kwargs) -> ChatOutput:
+        """Invoke the chain asynchronously with history formatting."""
+        return await self.chain.ainvoke(self._format_input(inputs, character, summary), **kwargs)
+
+    def astream(self, inputs: ChatInput, character, summary: str = "", **kwargs) -> AsyncIterator[BaseMessageChunk]:
+        """Stream the chain output chunk by chunk."""
+        return self.chain.astream(self._format_input(inputs, character, summary), **kwargs)
+
+    @staticmethod
+    def _format_input(inputs: ChatInput, character, summary: str = "") -> dict:
+        """Build the prompt variables from the chat input and character."""
+        # Format history（件数・文字数の予算への詰め込みは呼び出し側の resolve_chat_history で済ませている）
         history_text = ""
-        #20 会話まで
-        for msg in inputs.history[-20:]:
+        for msg in inputs.history:
             history_text += f"{msg.role}: {msg.content}\n"
 
         # Create formatted input
-        formatted_input = {
+        return {
             "role": inputs.role,
             "response": inputs.response,
             "history": history_text,
+            "summary": summary or "なし",
             "character_name": character.name,
             "character_age": character.age,
             "character_personality": ', '.join(character.personality or []),
@@ -101,8 +119,6 @@ class ChatChain(BaseChain):
             "character_specialties": ', '.join(character.specialties or []),
             "character_introduction": character.introduction,
         }
-        
-        return self.chain.invoke(formatted_input, **kwargs)
     
 class ConversationAnalysisChain(BaseChain):
     """Chain for analyzing conversation history"""
@@ -145,22 +161,15 @@ class ConversationAnalysisChain(BaseChain):
 
         return self.prompt.invoke(formatted_input, **kwargs).to_string()
         
-    async def invoke(self, 
-            inputs: ConversationAnalysisChainInput,            
-            db: Session,
-            mongodb: AsyncIOMotorDatabase
-        ):
-        """Invoke the chain for conversation analysis."""
-
-        collections = mongodb["chats"]
-        chat_history = await collections.find({"user_id": inputs.user_id, "character_id": inputs.character_id}).to_list(length=None)
+    async def invoke(self, history: List[ChatMessage]):
+        """Invoke the chain for conversation analysis.
 
-        message = [
-            ChatMessage(role=msg['role'], content=msg['content']) for msg in chat_history
-        ]
+        Args:
+            history: Recent chat messages (oldest first) to analyze
+        """
 
         history_text = ""
-        for msg in message[-10:]:
+        for msg in history:
             history_text += f"{msg.role}: {msg.content}\n"
 
         formatted_input = {
@@ -168,9 +177,9 @@ class ConversationAnalysisChain(BaseChain):
             "schema": SCHEMA_CNVERSATION_ANALYSIS,
         }
       
-        response = self.chain.invoke(formatted_input)
+        response = await self.chain.ainvoke(formatted_input)
 
-        print(f"Response: {response}")
+        logger.debug(f"Response: {response}")
 
         return json.loads(response)
     
@@ -228,22 +237,15 @@ class PositiveAnalysisChain(BaseChain):
 
         return self.prompt.invoke(formatted_input, **kwargs).to_string()
 
-    async def invoke(self, 
-            inputs: ConversationAnalysisChainInput,            
-            db: Session,
-            mongodb: AsyncIOMotorDatabase
-        ):
-        """Invoke the chain for conversation analysis."""
-
-        collections = mongodb["chats"]
-        chat_history = await collections.find({"user_id": inputs.user_id, "character_id": inputs.character_id}).to_list(length=None)
+    async def invoke(self, history: List[ChatMessage]):
+        """Invoke the chain for positive analysis.
 
-        message = [
-            ChatMessage(role=msg['role'], content=msg['content']) for msg in chat_history
-        ]
+        Args:
+            history: Recent chat messages (oldest first) to analyze
+        """
 
         history_text = ""
-        for msg in message[-10:]:
+        for msg in history:
             history_text += f"{msg.role}: {msg.content}\n"
 
         formatted_input = {
@@ -251,9 +253,9 @@ class PositiveAnalysisChain(BaseChain):
             "schema": SCHEMA_POSITIVE_ANALYSIS,
         }
       
-        response = self.chain.invoke(formatted_input)
+        response = await self.chain.ainvoke(formatted_input)
 
-        print(f"Response: {response}")
+        logger.debug(f"Response: {response}")
 
         return json.loads(response)
 
@@ -265,4 +267,56 @@ class PositiveAnalysisChain(BaseChain):
         # 正規表現を使って最後のカンマを削除
         replaced_output = re.sub(r',\s*$', '', replaced_output)
         # replaced_output = json.loads(replaced_output) # これを加えるとdict型になってしまう
-        return replaced_output
\ No newline at end of file
+        return replaced_output
+
+class ConversationSummaryChain(BaseChain):
+    """Chain for folding old conversation turns into a rolling summary"""
+
+    def __init__(self, 
+            chat_llm: BaseChatModel
+        ):
+        self.chat_llm = chat_llm
+        self.prompt = PromptTemplate(
+            template='''以下は、ユーザーとキャラクター（assistant）の会話の要約と、その続きの会話です。
+これまでの要約に続きの会話の内容を統合し、新しい要約を作成してください。
+ユーザーについて分かったこと（名前、好み、出来事など）と、話題の流れを優先して残してください。
+要約は日本語で400文字以内とし、要約以外のことは絶対に出力しないでください。
+
+これまでの要約:"""
+{summary}
+"""
+
+続きの会話:"""
+{history}
+"""
+''',
+    input_variables=["summary", "history"]
+        )
+        self.chain = self.prompt | self.chat_llm | StrOutputParser()
+
+    def get_prompt(self, inputs, **kwargs):
+        """Get the prompt string for conversation summary."""
+        history_text = ""
+        for msg in inputs.history:
+            history_text += f"{msg.role}: {msg.content}\n"
+
+        formatted_input = {
+            "summary": kwargs.pop("summary", "") or "なし",
+            "history": history_text,
+        }
+
+        return self.prompt.invoke(formatted_input, **kwargs).to_string()
+
+    async def invoke(self, history: List[ChatMessage], summary: str = "") -> str:
+        """Fold the given messages (oldest first) into the previous summary."""
+        history_text = ""
+        for msg in history:
+            history_text += f"{msg.role}: {msg.content}\n"
+
+        formatted_input = {
+            "summary": summary or "なし",
+            "history": history_text,
+        }
+
+        response = await self.chain.ainvoke(formatted_input)
+        return response.strip()
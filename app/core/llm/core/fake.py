@@ -0,0 +1,71 @@
+import asyncio
+import json
+from typing import AsyncIterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    ローカル開発・負荷試験用の偽のチャットモデル（LLM_PROVIDER=fake で使用）
+    プロンプトの内容から呼び出し元のチェーンを判別し、各チェーンがパースできる固定の応答を返す
+    latency秒だけ待ってから応答することで、外部APIの応答時間を模擬する
+    """
+
+    latency: float = 0.0
+    stream_chunk_size: int = 4
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._to_chat_result(self._respond(self._build_prompt(messages)))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._to_chat_result(self._respond(self._build_prompt(messages)))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = self._respond(self._build_prompt(messages))
+        for i in range(0, len(content), self.stream_chunk_size):
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=content[i:i + self.stream_chunk_size]),
+                generation_info={"role": "assistant"},
+            )
+
+    @staticmethod
+    def _build_prompt(messages) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    @staticmethod
+    def _respond(prompt: str) -> str:
+        if "福島に関連する語句" in prompt:
+            return json.dumps({
+                "matched_words": [
+                    {"word": "会津", "type": "地名", "reason": "福島県の地域名です。", "count_in_message": 1},
+                ],
+                "total_matched_count": 1,
+            }, ensure_ascii=False)
+        if "ポジティブ度" in prompt:
+            return json.dumps({
+                "sentiment": "positive",
+                "confidence": 0.8,
+                "reason": "前向きな発言が多く見られます。",
+            }, ensure_ascii=False)
+        if "新しい要約" in prompt:
+            return "ユーザーとキャラクターは福島の話題で会話しています。"
+        return "こんにちは！今日はどんなお話をしましょうか？"
+
+    @staticmethod
+    def _to_chat_result(content: str) -> ChatResult:
+        metadata = {"role": "assistant", "chunks": []}
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content), generation_info=metadata)],
+            llm_output=metadata,
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
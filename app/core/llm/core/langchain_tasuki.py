@@ -1,52 +1,197 @@
-from typing import Optional
+import json
+from typing import Any, AsyncIterator, Optional
 
+import httpx
 import requests
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import AIMessage, HumanMessage
-from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 
+from app.core.config import settings
+from app.core.llm.limiter import tasuki_limiter
 from app.schemas.chat import ChatOutput
 
+# プロセス内で共有するTASUKI用のHTTPクライアント（keep-aliveで接続を再利用する）
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """TASUKI呼び出し用の共有httpx.AsyncClientを取得（未作成なら作成）"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.TASUKI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TASUKI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.TASUKI_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.TASUKI_HTTP_TIMEOUT,
+                connect=settings.TASUKI_HTTP_CONNECT_TIMEOUT,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """共有httpx.AsyncClientを閉じる（アプリ終了時に呼び出す）"""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
 
 class LangchainTasuki(BaseChatModel):
 
     api_url: str
     api_key: Optional[str] = None
     project_id: Optional[str] = None
+    # 期限・リトライ・ヘッジ・サーキットブレーカーを適用するTasukiResilience（Noneなら素のまま呼び出す）
+    resilience: Optional[Any] = None
 
     def _generate(self, messages, stop=None, run_manager=None, **kwargs):
-        prompt = "\n".join([m.content for m in messages if isinstance(m, HumanMessage)])
+        prompt = self._build_prompt(messages)
         output = self._call(prompt)  # あなたの _call ロジック
-        return  ChatResult(
-            generations=[
-                ChatGeneration(
-                    message=AIMessage(content=output["choices"][0]["delta"]["content"]),
-                )
-            ],
-            llm_output={
-                "role": "assistant",
-                "chunks": output.get("chunks", []),
-            }
-        )
+        return self._to_chat_result(output)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._build_prompt(messages)
+        output = await self._acall(prompt)
+        return self._to_chat_result(output)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        """TASUKIのストリーミングAPIからdeltaを受信したそばから返す"""
+        prompt = self._build_prompt(messages)
+        client = get_http_client()
+
+        async def open_stream() -> httpx.Response:
+            request = client.build_request(
+                "POST",
+                self._endpoint(),
+                json=self._build_payload(prompt, stream=True),
+                headers=self._build_headers(),
+            )
+            response = await client.send(request, stream=True)
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError:
+                await response.aclose()
+                raise
+            return response
+
+        # ストリームを読み終えるまで実行枠を保持する
+        # リトライは応答ヘッダーを受信するまでに限り、ヘッジは行わない
+        async with tasuki_limiter.slot():
+            if self.resilience is None:
+                response = await open_stream()
+            else:
+                response = await self.resilience.call(open_stream, hedge=False)
+            try:
+                async for line in response.aiter_lines():
+                    event = self._parse_stream_line(line)
+                    if event is None:
+                        continue
+                    choices = event.get("choices") or [{}]
+                    delta = choices[0].get("delta") or choices[0].get("message") or {}
+                    content = delta.get("content") or ""
+                    generation_info = {"role": "assistant"}
+                    if event.get("chunks"):
+                        generation_info["chunks"] = event["chunks"]
+                    if not content and len(generation_info) == 1:
+                        continue
+                    chunk = ChatGenerationChunk(
+                        message=AIMessageChunk(content=content),
+                        generation_info=generation_info,
+                    )
+                    if run_manager and content:
+                        await run_manager.on_llm_new_token(content, chunk=chunk)
+                    yield chunk
+            finally:
+                await response.aclose()
+
+    @staticmethod
+    def _parse_stream_line(line: str) -> Optional[dict]:
+        """SSE（data: ...）またはNDJSONの1行をパースする。本文以外の行はNoneを返す"""
+        line = line.strip()
+        if not line or line.startswith(":"):
+            return None
+        if line.startswith("data:"):
+            line = line[len("data:"):].strip()
+        elif line.startswith(("event:", "id:", "retry:")):
+            return None
+        if line == "[DONE]":
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            return None
 
     def _call(self, prompt: str, **kwargs) -> ChatOutput:
+        response = requests.post(
+            self._endpoint(),
+            json=self._build_payload(prompt),
+            headers=self._build_headers(),
+            timeout=(settings.TASUKI_HTTP_CONNECT_TIMEOUT, settings.TASUKI_HTTP_TIMEOUT),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def _acall(self, prompt: str, **kwargs) -> ChatOutput:
+        client = get_http_client()
+
+        async def send() -> ChatOutput:
+            async with tasuki_limiter.slot():
+                response = await client.post(
+                    self._endpoint(),
+                    json=self._build_payload(prompt),
+                    headers=self._build_headers(),
+                )
+            response.raise_for_status()
+            return response.json()
 
-        headers = {
+        if self.resilience is None:
+            return await send()
+        return await self.resilience.call(send)
+
+    @staticmethod
+    def _build_prompt(messages) -> str:
+        return "\n".join([m.content for m in messages if isinstance(m, HumanMessage)])
+
+    def _endpoint(self) -> str:
+        return f"{self.api_url}/project/{self.project_id}/ragchat"
+
+    def _build_headers(self) -> dict:
+        return {
             "Authorization": f"{self.api_key}" if self.api_key else "",
             "Content-Type": "application/json"
         }
 
-        payload = {
+    @staticmethod
+    def _build_payload(prompt: str, stream: bool = False) -> dict:
+        return {
             "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
+            "stream": stream,
             "max_completion_tokens": 512,
             "temperature": 0.7,
             "top_p": 1.0,
             "frequency_penalty": 0.0
         }
-        response = requests.post(f"{self.api_url}/project/{self.project_id}/ragchat", json=payload, headers=headers)
-        response.raise_for_status()
-        return response.json()
+
+    @staticmethod
+    def _to_chat_result(output: dict) -> ChatResult:
+        metadata = {
+            "role": "assistant",
+            "chunks": output.get("chunks", []),
+        }
+        return ChatResult(
+            generations=[
+                ChatGeneration(
+                    message=AIMessage(content=output["choices"][0]["delta"]["content"]),
+                    generation_info=metadata,
+                )
+            ],
+            llm_output=metadata,
+        )
 
     @property
     def _llm_type(self) -> str:
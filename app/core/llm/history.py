@@ -0,0 +1,27 @@
+from typing import List, Sequence, Tuple
+
+from app.schemas.chat import ChatMessage
+
+
+def estimate_message_size(message: ChatMessage) -> int:
+    """
+    プロンプト上でのメッセージの大きさを文字数で見積もる
+    日本語は1文字あたりおおよそ1トークンのため、文字数をトークン数の目安として扱う
+    """
+    return len(message.role) + len(message.content) + 3  # "role: content\n"
+
+
+def pack_history(messages: Sequence[ChatMessage], budget: int) -> Tuple[List[ChatMessage], List[ChatMessage]]:
+    """
+    会話履歴を新しいものから順に予算（文字数）に収まるだけ詰める
+    収まらなかった古いメッセージは要約に回すため、(採用したメッセージ, 溢れたメッセージ) をどちらも古い順で返す
+    """
+    total = 0
+    start = len(messages)
+    for i in range(len(messages) - 1, -1, -1):
+        size = estimate_message_size(messages[i])
+        if total + size > budget:
+            break
+        total += size
+        start = i
+    return list(messages[start:]), list(messages[:start])
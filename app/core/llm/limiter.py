@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LLM_IN_FLIGHT = Gauge(
+    "llm_in_flight_requests",
+    "実行中のLLM呼び出し数",
+    labelnames=("provider",),
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth",
+    "実行枠の空きを待っているLLM呼び出し数",
+    labelnames=("provider",),
+)
+LLM_QUEUE_WAIT = Histogram(
+    "llm_queue_wait_seconds",
+    "LLM呼び出しが実行枠を得るまでの待ち時間",
+    labelnames=("provider",),
+)
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds",
+    "LLM呼び出しの所要時間（実行枠を得てから解放するまで。ストリーミングは読み終えるまで）",
+    labelnames=("provider", "outcome"),
+)
+LLM_REJECTED = Counter(
+    "llm_rejected_requests_total",
+    "過負荷のため拒否したLLM呼び出し数",
+    labelnames=("provider", "reason"),
+)
+
+
+class ConcurrencyLimiter:
+    """
+    プロバイダーごとのLLM呼び出しの同時実行数を制限する
+    実行枠が埋まっている間は最大max_queue件まで待たせ、待ち行列が溢れた場合や
+    queue_timeout秒待っても枠が空かない場合は、503（Retry-After付き）で即座に失敗させる
+    """
+
+    def __init__(self, provider: str, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        # 呼び出し元が実行枠を確保済みのコンテキストか（held()の中ではslot()は枠を確保しない）
+        self._held: ContextVar[bool] = ContextVar(f"llm_slot_held_{provider}", default=False)
+        LLM_IN_FLIGHT.labels(provider=provider).set_function(lambda: self._in_flight)
+        LLM_QUEUE_DEPTH.labels(provider=provider).set_function(lambda: self._waiting)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """実行枠を1つ確保してから処理を実行する"""
+        if self._held.get():
+            # 呼び出し元（ストリーミングのエンドポイントなど）が確保した枠で実行する
+            yield
+            return
+
+        if self._in_flight + self._waiting >= self.max_concurrency + self.max_queue:
+            self._reject("queue_full")
+
+        self._waiting += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+        finally:
+            self._waiting -= 1
+            LLM_QUEUE_WAIT.labels(provider=self.provider).observe(time.perf_counter() - started)
+
+        self._in_flight += 1
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "success"
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+            LLM_REQUEST_DURATION.labels(provider=self.provider, outcome=outcome).observe(time.perf_counter() - started)
+
+    @contextmanager
+    def held(self) -> Iterator[None]:
+        """
+        呼び出し元が slot() で確保済みの実行枠を、このコンテキスト内のLLM呼び出しに使わせる
+        レスポンスを返し始める前に枠を確保し、503を通常のエラーレスポンスとして返すために使う
+        """
+        token = self._held.set(True)
+        try:
+            yield
+        finally:
+            self._held.reset(token)
+
+    def _reject(self, reason: str) -> None:
+        LLM_REJECTED.labels(provider=self.provider, reason=reason).inc()
+        logger.warning(
+            f"LLM呼び出しが過負荷のため拒否しました: provider={self.provider}, reason={reason}, "
+            f"in_flight={self._in_flight}, waiting={self._waiting}"
+        )
+        raise HTTPException(
+            status_code=503,
+            detail=f"{self.provider}が混み合っています。しばらくしてから再度お試しください。",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+tasuki_limiter = ConcurrencyLimiter(
+    "tasuki",
+    max_concurrency=settings.TASUKI_MAX_CONCURRENCY,
+    max_queue=settings.TASUKI_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+    retry_after=settings.LLM_RETRY_AFTER,
+)
+bedrock_limiter = ConcurrencyLimiter(
+    "bedrock",
+    max_concurrency=settings.BEDROCK_MAX_CONCURRENCY,
+    max_queue=settings.BEDROCK_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+    retry_after=settings.LLM_RETRY_AFTER,
+)
@@ -0,0 +1,126 @@
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from app.core.aws.bedrock_client import BedrockClient
+from app.core.config import settings
+from app.core.llm.chain.base import BaseChain
+from app.core.llm.chain.chatchain import ChatChain, ConversationAnalysisChain, ConversationSummaryChain, PositiveAnalysisChain
+from app.core.llm.core.fake import FakeChatModel
+from app.core.tasuki.tasuki_client import TasukiClient
+
+logger = logging.getLogger(__name__)
+
+
+class LLMRegistry:
+    """
+    TASUKI/Bedrockのチャットモデルとチェーンをプロセス内で共有するレジストリ
+    tasuki_project_id / BedrockのモデルIDごとに一度だけ構築し、リクエスト間で再利用する
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tasuki_client: Optional[TasukiClient] = None
+        self._bedrock_clients: Dict[str, BedrockClient] = {}
+        self._chat_models: Dict[str, BaseChatModel] = {}
+        self._chains: Dict[Tuple[str, str], BaseChain] = {}
+        self._character_projects: Dict[int, str] = {}
+
+    def get_tasuki_client(self) -> TasukiClient:
+        """共有TASUKIクライアントを取得"""
+        with self._lock:
+            if self._tasuki_client is None:
+                self._tasuki_client = TasukiClient()
+            return self._tasuki_client
+
+    def get_bedrock_client(self, model_id: Optional[str] = None) -> BedrockClient:
+        """モデルIDごとの共有Bedrockクライアントを取得"""
+        model_id = model_id or settings.AWS_BEDROCK_MODEL_ID
+        with self._lock:
+            if model_id not in self._bedrock_clients:
+                self._bedrock_clients[model_id] = BedrockClient(model_id=model_id)
+            return self._bedrock_clients[model_id]
+
+    def get_chat_model(self, project_id: str) -> BaseChatModel:
+        """TASUKIプロジェクトごとの共有チャットモデルを取得"""
+        if not project_id:
+            raise ValueError("プロジェクトIDが指定されていません。")
+        with self._lock:
+            if project_id not in self._chat_models:
+                if settings.LLM_PROVIDER == "fake":
+                    self._chat_models[project_id] = FakeChatModel(latency=settings.FAKE_LLM_LATENCY)
+                else:
+                    self._chat_models[project_id] = self.get_tasuki_client().get_chat_model(project_id)
+            return self._chat_models[project_id]
+
+    def get_bedrock_model(self, model_id: Optional[str] = None) -> BaseChatModel:
+        """モデルIDごとの共有Bedrockチャットモデルを取得"""
+        if settings.LLM_PROVIDER == "fake":
+            return self.get_chat_model(f"fake-bedrock:{model_id or settings.AWS_BEDROCK_MODEL_ID}")
+        return self.get_bedrock_client(model_id).get_client()
+
+    def get_chat_chain(self, project_id: str) -> ChatChain:
+        """TASUKIプロジェクトごとのチャットチェーンを取得"""
+        return self._get_chain("chat", project_id, lambda: ChatChain(chat_llm=self.get_chat_model(project_id)))
+
+    def get_conversation_analysis_chain(self, project_id: str) -> ConversationAnalysisChain:
+        """TASUKIプロジェクトごとの会話分析チェーンを取得"""
+        return self._get_chain(
+            "conversation_analysis", project_id,
+            lambda: ConversationAnalysisChain(chat_llm=self.get_chat_model(project_id)),
+        )
+
+    def get_positive_analysis_chain(self, model_id: Optional[str] = None) -> PositiveAnalysisChain:
+        """BedrockのモデルIDごとのポジティブ分析チェーンを取得"""
+        model_id = model_id or settings.AWS_BEDROCK_MODEL_ID
+        return self._get_chain(
+            "positive_analysis", model_id,
+            lambda: PositiveAnalysisChain(chat_llm=self.get_bedrock_model(model_id)),
+        )
+
+    def get_summary_chain(self, model_id: Optional[str] = None) -> ConversationSummaryChain:
+        """BedrockのモデルIDごとの会話要約チェーンを取得"""
+        model_id = model_id or settings.AWS_BEDROCK_MODEL_ID
+        return self._get_chain(
+            "summary", model_id,
+            lambda: ConversationSummaryChain(chat_llm=self.get_bedrock_model(model_id)),
+        )
+
+    def bind_character(self, character_id: int, project_id: str) -> None:
+        """
+        キャラクターとTASUKIプロジェクトの対応を記録する
+        キャラクターのプロジェクトIDが変わっていた場合は、他に使われていない旧プロジェクトのエントリを破棄する
+        """
+        with self._lock:
+            previous = self._character_projects.get(character_id)
+            self._character_projects[character_id] = project_id
+            if previous and previous != project_id and previous not in self._character_projects.values():
+                logger.info(f"キャラクターのTASUKIプロジェクトが変更されました: character_id={character_id}, {previous} -> {project_id}")
+                self.evict_project(previous)
+
+    def evict_project(self, project_id: str) -> None:
+        """TASUKIプロジェクトに紐づくモデルとチェーンを破棄"""
+        with self._lock:
+            self._chat_models.pop(project_id, None)
+            for key in [key for key in self._chains if key[1] == project_id]:
+                del self._chains[key]
+
+    def clear(self) -> None:
+        """全てのエントリを破棄（アプリ終了時に呼び出す）"""
+        with self._lock:
+            self._tasuki_client = None
+            self._bedrock_clients.clear()
+            self._chat_models.clear()
+            self._chains.clear()
+            self._character_projects.clear()
+
+    def _get_chain(self, kind: str, key: str, factory: Callable[[], BaseChain]) -> BaseChain:
+        with self._lock:
+            if (kind, key) not in self._chains:
+                self._chains[(kind, key)] = factory()
+            return self._chains[(kind, key)]
+
+
+llm_registry = LLMRegistry()
@@ -0,0 +1,16 @@
+from typing import Sequence
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, generate_latest
+from prometheus_client import Histogram as _Histogram
+
+__all__ = ["CONTENT_TYPE_LATEST", "DEFAULT_BUCKETS", "REGISTRY", "Counter", "Gauge", "Histogram", "generate_latest"]
+
+# Prometheusのデフォルトのバケットに、LLMの呼び出しなど10秒を超える処理のためのバケットを加えたもの（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram(_Histogram):
+    """バケットの既定値をDEFAULT_BUCKETSにしたprometheus_clientのHistogram"""
+
+    def __init__(self, name: str, documentation: str, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(name, documentation, *args, buckets=buckets, **kwargs)
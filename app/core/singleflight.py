@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# ロックの所有者のみが削除できるようにするスクリプト
+_RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    同じキーで同時に呼び出された処理を1回の実行にまとめる（プロセス内）
+    実行中の呼び出しがあれば、後から来た呼び出しはその結果（または例外）を共有する
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def inflight(self) -> int:
+        """実行中のキーの数"""
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            # 呼び出し元がキャンセルされても他の待機者のために実行を継続する
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 待機者が全てキャンセルされた場合でも例外の未取得警告を出さない
+        if not task.cancelled():
+            task.exception()
+
+
+class RedisSingleFlight:
+    """
+    Redisのロックを使って複数Podにまたがって同じキーの処理を1回の実行にまとめる
+    プロセス内ではSingleFlightでまとめたうえで、ロックを取得できたPodだけが実行し、
+    他のPodは結果がRedisに書き込まれるのを待って共有する（結果はJSONで保存する）
+    """
+
+    def __init__(
+        self,
+        redis_client_factory: Callable[[], Any],
+        namespace: str,
+        lock_ttl: float = 60.0,
+        result_ttl: float = 10.0,
+        poll_interval: float = 0.1,
+    ):
+        self._redis = redis_client_factory
+        self._local = SingleFlight()
+        self.namespace = namespace
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        return await self._local.do(key, lambda: self._do_distributed(key, fn))
+
+    async def _do_distributed(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        lock_key = f"singleflight:{self.namespace}:lock:{key}"
+        result_key = f"singleflight:{self.namespace}:result:{key}"
+        token = uuid.uuid4().hex
+        client = self._redis()
+
+        try:
+            acquired = await client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            logger.warning(f"シングルフライトのロック取得に失敗したため単独で実行します: {e}")
+            return await fn()
+
+        if acquired:
+            try:
+                # 以前の実行結果を読まれないように削除してから実行する
+                await client.delete(result_key)
+                result = await fn()
+                await client.set(result_key, json.dumps(result, ensure_ascii=False), px=int(self.result_ttl * 1000))
+                return result
+            finally:
+                try:
+                    await client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.warning(f"シングルフライトのロック解放に失敗しました: {e}")
+
+        # 他のPodが実行中のため、結果が書き込まれるのを待つ
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.lock_ttl
+        while loop.time() < deadline:
+            cached = await client.get(result_key)
+            if cached is not None:
+                return json.loads(cached)
+            if not await client.exists(lock_key):
+                # 実行元が失敗した（結果が書き込まれずにロックが解放された）
+                cached = await client.get(result_key)
+                if cached is not None:
+                    return json.loads(cached)
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        return await fn()
@@ -1,14 +1,249 @@
+import asyncio
 import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
 
 import httpx
 from fastapi import HTTPException
 from langchain_core.language_models.chat_models import BaseChatModel
 
 from app.core.config import settings
-from app.core.llm.core.langchain_tasuki import LangchainTasuki
+from app.core.llm.core.langchain_tasuki import LangchainTasuki, get_http_client
+from app.core.metrics import Counter, Gauge
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# 一時的な障害とみなしてリトライするHTTPステータス
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+TASUKI_CIRCUIT_STATE = Gauge(
+    "tasuki_circuit_state",
+    "TASUKIのサーキットブレーカーの状態（0: closed, 1: half_open, 2: open）",
+    labelnames=("name",),
+)
+TASUKI_CIRCUIT_TRANSITIONS = Counter(
+    "tasuki_circuit_transitions_total",
+    "TASUKIのサーキットブレーカーの状態遷移数",
+    labelnames=("name", "state"),
+)
+TASUKI_RETRIES = Counter(
+    "tasuki_retries_total",
+    "TASUKI呼び出しのリトライ数",
+    labelnames=("reason",),
+)
+TASUKI_HEDGES = Counter(
+    "tasuki_hedged_requests_total",
+    "TASUKI呼び出しでヘッジ（2本目のリクエスト）を送った数",
+    labelnames=("winner",),
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """リトライしてよい一時的な障害か（接続エラー・タイムアウト・1回の試行の時間切れ・429/502/503/504）"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """TASUKI側の不調を示すエラーか（サーキットブレーカーの失敗として数える）"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    連続してfailure_threshold回失敗するとopenになり、recovery_timeout秒の間は呼び出しを即座に失敗させる
+    recovery_timeout経過後はhalf_openとして1件だけ試行を通し、成功すればclosedに戻す
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        TASUKI_CIRCUIT_STATE.labels(name=name).set_function(lambda: self._STATE_VALUES[self.state])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._transition(self.HALF_OPEN)
+            return self._state
+
+    def allow(self) -> None:
+        """呼び出しを許可するか判定し、許可しない場合は503で即座に失敗させる"""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            retry_after = max(1, int(self.recovery_timeout - (time.monotonic() - self._opened_at)))
+        raise HTTPException(
+            status_code=503,
+            detail="TASUKIが一時的に利用できません。しばらくしてから再度お試しください。",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != self.OPEN:
+                    self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """TASUKIの状態と無関係な理由で試行が終わった場合に、half_openの試行枠を戻す"""
+        with self._lock:
+            self._probing = False
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"TASUKIのサーキットブレーカーが遷移しました: {self.name} {self._state} -> {state}")
+        self._state = state
+        if state == self.HALF_OPEN:
+            self._probing = False
+        TASUKI_CIRCUIT_TRANSITIONS.labels(name=self.name, state=state).inc()
+
+
+class LatencyTracker:
+    """直近の呼び出しのレイテンシを保持し、パーセンタイルを計算する"""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, default: float) -> float:
+        if len(self._samples) < 20:
+            return default
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+class TasukiResilience:
+    """
+    TASUKI呼び出しの耐障害レイヤー
+    - 呼び出し全体の期限（deadline）。1回の試行はattempt_timeoutと期限までの残り時間の短い方で打ち切り、
+      期限内にリトライ・ヘッジが完了できるようにする
+    - 一時的な障害に対するジッター付き指数バックオフのリトライ
+    - 直近のp95を超えても応答がない場合のヘッジ（2本目のリクエスト）
+    - TASUKIの不調時に即座に失敗させるサーキットブレーカー
+    チャット生成はTASUKI側に状態を残さないため、冪等な呼び出しとしてリトライ・ヘッジの対象とする
+    """
+
+    def __init__(
+        self,
+        deadline: float = settings.TASUKI_CALL_DEADLINE,
+        attempt_timeout: float = settings.TASUKI_HTTP_TIMEOUT,
+        max_attempts: int = settings.TASUKI_RETRY_MAX_ATTEMPTS,
+        base_delay: float = settings.TASUKI_RETRY_BASE_DELAY,
+        max_delay: float = settings.TASUKI_RETRY_MAX_DELAY,
+        hedge_enabled: bool = settings.TASUKI_HEDGE_ENABLED,
+        hedge_delay: float = settings.TASUKI_HEDGE_DELAY,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker(
+            "tasuki",
+            failure_threshold=settings.TASUKI_BREAKER_FAILURE_THRESHOLD,
+            recovery_timeout=settings.TASUKI_BREAKER_RECOVERY_TIMEOUT,
+        )
+        self.latency = LatencyTracker()
+
+    async def call(self, fn: Callable[[], Awaitable[T]], hedge: bool = True) -> T:
+        """fnを期限・リトライ・ヘッジ・サーキットブレーカー付きで実行する"""
+        try:
+            return await self._call_with_retries(fn, hedge, time.monotonic() + self.deadline)
+        except asyncio.TimeoutError:
+            # 時間切れの試行はサーキットブレーカーの失敗として記録済み
+            raise HTTPException(status_code=504, detail="TASUKIの応答がタイムアウトしました。")
+
+    async def _call_with_retries(self, fn: Callable[[], Awaitable[T]], hedge: bool, deadline_at: float) -> T:
+        for attempt in range(self.max_attempts):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            self.breaker.allow()
+            started = time.perf_counter()
+            try:
+                call = self._call_hedged(fn) if hedge and self.hedge_enabled else fn()
+                result = await asyncio.wait_for(call, timeout=min(self.attempt_timeout, remaining))
+            except Exception as e:
+                if is_upstream_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                if not is_retryable(e) or attempt + 1 >= self.max_attempts:
+                    raise
+                reason = f"status_{e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+                TASUKI_RETRIES.labels(reason=reason).inc()
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                delay = min(delay, max(0.0, deadline_at - time.monotonic()))
+                logger.warning(f"TASUKI呼び出しに失敗したためリトライします（{attempt + 1}/{self.max_attempts}, {delay:.2f}秒後）: {e or type(e).__name__}")
+                await asyncio.sleep(delay)
+                continue
+            self.latency.observe(time.perf_counter() - started)
+            self.breaker.record_success()
+            return result
+        raise AssertionError("unreachable")
+
+    async def _call_hedged(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """p95の時間が経っても応答がなければ2本目を送り、先に成功した方の結果を使う"""
+        delay = self.latency.percentile(0.95, default=self.hedge_delay)
+        primary = asyncio.ensure_future(fn())
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedged = asyncio.ensure_future(fn())
+        pending = {primary, hedged}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        TASUKI_HEDGES.labels(winner="primary" if task is primary else "hedge").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
 class TasukiClient:
     """TASUKIクライアント"""
     
@@ -18,7 +253,7 @@ class TasukiClient:
             raise ValueError("TASUKIのベースURLが設定されていません。")
         logger.info(f"TASUKIクライアントを初期化しました: {self.base_url}")
         self.api_key = settings.TASUKI_API_KEY
-        if not self.api_key:
+        if not self.api_key and settings.LLM_PROVIDER != "fake":
             raise ValueError("TASUKIのAPIキーが設定されていません。")
 
         self.headers = {
@@ -26,16 +261,18 @@ class TasukiClient:
             "Accept": "application/json",
             "Content-Type": "application/json"
         } 
+        # 全プロジェクトのチャットモデルで共有する（TASUKIの不調はプロジェクトに依らないため）
+        self.resilience = TasukiResilience()
     
     def get_base_url(self) -> str:
         """TASUKIのベースURLを取得"""
         return self.base_url
     
     async def get(self, path):
-        async with httpx.AsyncClient() as client:
-            logger.info(f"TASUKI APIにGETリクエストを送信: {self.base_url+path}")
-            response = await client.get(self.base_url+path, headers=self.headers)
-            return response.json()
+        client: httpx.AsyncClient = get_http_client()
+        logger.info(f"TASUKI APIにGETリクエストを送信: {self.base_url+path}")
+        response = await client.get(self.base_url+path, headers=self.headers)
+        return response.json()
         
     def get_chat_model(self, project_id: str) -> BaseChatModel:    
         """TASUKIプロジェクト用のチャットクライアントを作成"""
@@ -46,7 +283,8 @@ class TasukiClient:
             self._client = LangchainTasuki(
                 api_url=self.base_url,
                 api_key=self.api_key,
-                project_id=project_id
+                project_id=project_id,
+                resilience=self.resilience,
             )
         except Exception as e:
             logger.error(f"TASUKIクライアントの初期化に失敗しました: {e}")
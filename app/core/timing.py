@@ -0,0 +1,62 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Iterator, List, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+T = TypeVar("T")
+
+STAGE_DURATION = Histogram(
+    "request_stage_duration_seconds",
+    "エンドポイント内の各処理段階の所要時間",
+    labelnames=("endpoint", "stage", "provider", "character"),
+)
+
+
+class StageTimer:
+    """
+    1リクエスト内の処理段階ごとの所要時間を計測する
+    計測結果はヒストグラム（エンドポイント・段階・呼び出し先・キャラクター別）に記録し、
+    SERVER_TIMING_ENABLED が有効な場合は Server-Timing ヘッダーとして返せるよう保持する
+    キャラクターのラベルは存在を確認したキャラクターに限り set_character で設定する
+    （パスパラメータの値をそのまま使うと、存在しないIDのリクエストごとに系列が増えるため）
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.character = ""
+        self._stages: List[Tuple[str, float]] = []
+
+    def set_character(self, character: Any) -> None:
+        """以降の段階をキャラクター別に記録する（DBから取得できたキャラクターを渡す）"""
+        self.character = str(character.id)
+
+    @contextmanager
+    def stage(self, name: str, provider: str = "app") -> Iterator[None]:
+        """withブロックの所要時間を計測する"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started, provider)
+
+    async def measure(self, name: str, awaitable: Awaitable[T], provider: str = "app") -> T:
+        """awaitableの完了までの所要時間を計測する（asyncio.gatherで並行実行する段階に使う）"""
+        with self.stage(name, provider):
+            return await awaitable
+
+    def record(self, name: str, seconds: float, provider: str = "app") -> None:
+        STAGE_DURATION.labels(
+            endpoint=self.endpoint, stage=name, provider=provider, character=self.character,
+        ).observe(seconds)
+        self._stages.append((name, seconds))
+
+    def server_timing(self) -> str:
+        """Server-Timingヘッダーの値（ミリ秒）"""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self._stages)
+
+    def apply(self, response: Any) -> None:
+        """SERVER_TIMING_ENABLED が有効な場合、計測済みの段階をレスポンスのヘッダーに設定する"""
+        if settings.SERVER_TIMING_ENABLED and self._stages:
+            response.headers["Server-Timing"] = self.server_timing()
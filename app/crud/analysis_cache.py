@@ -0,0 +1,93 @@
+import hashlib
+import json
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.crud.redis import get_redis_client
+from app.schemas.chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_REQUESTS = Counter(
+    "analysis_cache_requests_total",
+    "会話分析結果キャッシュの参照数",
+    labelnames=("kind", "result"),
+)
+
+
+class AnalysisCacheService:
+    """
+    会話分析・ポジティブ分析の結果をRedisにキャッシュするサービス
+    (user_id, character_id) ごとのハッシュに、分析種別と分析対象メッセージのフィンガープリントをフィールドとして保存する
+    """
+
+    @staticmethod
+    def fingerprint(history: List[ChatMessage]) -> str:
+        """分析対象のメッセージ列からフィンガープリントを計算"""
+        payload = json.dumps(
+            [[msg.role, msg.content] for msg in history],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _key(user_id: int, character_id: int) -> str:
+        return f"analysis:{user_id}:{character_id}"
+
+    async def get(self, kind: str, user_id: int, character_id: int, fingerprint: str) -> Optional[Any]:
+        """キャッシュ済みの分析結果を取得"""
+        try:
+            cached = await get_redis_client().hget(self._key(user_id, character_id), f"{kind}:{fingerprint}")
+        except Exception as e:
+            logger.warning(f"分析結果キャッシュの取得に失敗しました: {e}")
+            cached = None
+
+        ANALYSIS_CACHE_REQUESTS.labels(kind=kind, result="hit" if cached is not None else "miss").inc()
+        if cached is None:
+            return None
+        return json.loads(cached)
+
+    async def set(self, kind: str, user_id: int, character_id: int, fingerprint: str, result: Any) -> None:
+        """分析結果をキャッシュ"""
+        key = self._key(user_id, character_id)
+        try:
+            async with get_redis_client().pipeline(transaction=True) as pipe:
+                pipe.hset(key, f"{kind}:{fingerprint}", json.dumps(result, ensure_ascii=False))
+                pipe.expire(key, settings.ANALYSIS_CACHE_TTL)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"分析結果のキャッシュに失敗しました: {e}")
+
+    async def get_or_compute(
+        self,
+        kind: str,
+        user_id: int,
+        character_id: int,
+        history: List[ChatMessage],
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        キャッシュがあればそれを返し、なければ分析を実行してキャッシュする
+        未分析のメッセージが残っている途中の結果（stale）は、次の呼び出しで続きを分析するためキャッシュしない
+        """
+        fingerprint = self.fingerprint(history)
+        cached = await self.get(kind, user_id, character_id, fingerprint)
+        if cached is not None:
+            return cached
+        result = await compute()
+        if not (isinstance(result, dict) and result.get("stale")):
+            await self.set(kind, user_id, character_id, fingerprint, result)
+        return result
+
+    async def invalidate(self, user_id: int, character_id: int) -> None:
+        """ユーザーとキャラクターの分析結果キャッシュを削除（メッセージ保存時に呼び出す）"""
+        try:
+            await get_redis_client().delete(self._key(user_id, character_id))
+        except Exception as e:
+            logger.warning(f"分析結果キャッシュの削除に失敗しました: {e}")
+
+
+analysis_cache = AnalysisCacheService()
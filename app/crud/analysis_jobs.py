@@ -0,0 +1,160 @@
+import asyncio
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge
+from app.crud.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+FINISHED_STATUSES = (JOB_STATUS_SUCCEEDED, JOB_STATUS_FAILED)
+
+ANALYSIS_JOBS = Counter(
+    "analysis_jobs_total",
+    "会話分析ジョブの処理数",
+    labelnames=("status",),
+)
+ANALYSIS_JOB_QUEUE_DEPTH = Gauge(
+    "analysis_job_queue_depth",
+    "処理待ちの会話分析ジョブ数",
+)
+
+
+class AnalysisJobService:
+    """
+    会話分析をジョブとして非同期に実行するサービス
+    ジョブはプロセス内のキューに積み、ワーカーが順に実行する
+    ジョブの状態と結果はRedisに保存するため、どのPodでも問い合わせに応答できる
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.ANALYSIS_JOB_WORKERS,
+        max_queue_size: int = settings.ANALYSIS_JOB_MAX_QUEUE_SIZE,
+        ttl: int = settings.ANALYSIS_JOB_TTL,
+        poll_interval: float = 0.2,
+    ):
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        ANALYSIS_JOB_QUEUE_DEPTH.set_function(lambda: self.pending)
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    @property
+    def pending(self) -> int:
+        """処理待ちのジョブ数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> None:
+        """ワーカーを開始（アプリ起動時に呼び出す）"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(f"会話分析ジョブのワーカーを開始しました: workers={self.workers}")
+
+    async def stop(self) -> None:
+        """処理待ちのジョブを全て実行してからワーカーを停止（アプリ終了時に呼び出す）"""
+        if not self.running:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("会話分析ジョブのワーカーを停止しました")
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"analysis_job:{job_id}"
+
+    async def submit(self, user_id: int, character_id: int, compute: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+        """ジョブを登録してキューに積み、登録したジョブの状態を返す"""
+        if not self.running:
+            raise HTTPException(status_code=503, detail="会話分析ジョブのワーカーが起動していません。")
+        if self._queue.full():
+            raise HTTPException(
+                status_code=503,
+                detail="会話分析ジョブが混み合っています。しばらくしてから再度お試しください。",
+                headers={"Retry-After": str(settings.LLM_RETRY_AFTER)},
+            )
+
+        now = datetime.utcnow().isoformat()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "character_id": character_id,
+            "status": JOB_STATUS_QUEUED,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self._save(job)
+        self._queue.put_nowait((job, compute))
+        ANALYSIS_JOBS.labels(status=JOB_STATUS_QUEUED).inc()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブの状態を取得（存在しない・期限切れの場合はNone）"""
+        cached = await get_redis_client().get(self._key(job_id))
+        if cached is None:
+            return None
+        return json.loads(cached)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """ジョブが終了するか、timeout秒経過するまで待ってからジョブの状態を返す"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        job = await self.get(job_id)
+        while job is not None and job["status"] not in FINISHED_STATUSES and loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            job = await self.get(job_id)
+        return job
+
+    async def _save(self, job: Dict[str, Any]) -> None:
+        job["updated_at"] = datetime.utcnow().isoformat()
+        await get_redis_client().set(self._key(job["job_id"]), json.dumps(job, ensure_ascii=False), ex=self.ttl)
+
+    async def _run(self) -> None:
+        while True:
+            item: Tuple[Dict[str, Any], Callable[[], Awaitable[Any]]] = await self._queue.get()
+            try:
+                await self._execute(*item)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: Dict[str, Any], compute: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            job["status"] = JOB_STATUS_RUNNING
+            await self._save(job)
+            job["result"] = await compute()
+            job["status"] = JOB_STATUS_SUCCEEDED
+        except Exception as e:
+            logger.exception(f"会話分析ジョブに失敗しました: job_id={job['job_id']}")
+            job["status"] = JOB_STATUS_FAILED
+            job["error"] = e.detail if isinstance(e, HTTPException) else str(e)
+        ANALYSIS_JOBS.labels(status=job["status"]).inc()
+        try:
+            await self._save(job)
+        except Exception as e:
+            logger.error(f"会話分析ジョブの状態の保存に失敗しました: job_id={job['job_id']}, {e}")
+
+
+analysis_jobs = AnalysisJobService()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from app.crud.chat_writer import chat_message_writer
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "chat_counters"
+
+# ユーザー全体のカウンター（scope=user）と、ユーザー×キャラクターごとのカウンター（scope=character）を同じコレクションに持つ
+SCOPE_USER = "user"
+SCOPE_CHARACTER = "character"
+
+
+async def increment_chat_counters(mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int, timestamp: str) -> None:
+    """
+    チャットメッセージの保存時に、ユーザー全体とキャラクターごとのメッセージ数・最終チャット日時を更新する
+    それぞれアトミックな$inc/$maxで更新し、2つの更新は並行して送る
+    """
+    collections = mongodb[COLLECTION_NAME]
+    update = {"$inc": {"count": 1}, "$max": {"last_chat_date": timestamp}}
+    await asyncio.gather(
+        collections.update_one({"user_id": user_id, "scope": SCOPE_USER, "character_id": None}, update, upsert=True),
+        collections.update_one({"user_id": user_id, "scope": SCOPE_CHARACTER, "character_id": character_id}, update, upsert=True),
+    )
+
+
+async def reconcile_user_chat_counters(mongodb: AsyncIOMotorDatabase, user_id: int) -> List[Dict[str, Any]]:
+    """
+    chatsコレクションを集計してユーザーのカウンターを補正し、カウンターのドキュメントを返す
+    カウンター導入前のデータの初期化と、カウンターのずれの補正に使う（管理者・バッチからのみ呼び出す）
+    集計前に読んだcountとの差分を、countが変わっていない場合にだけ$incで適用するため、
+    集計中にチャットの保存でインクリメントされたカウンターは上書きせずにスキップする（次回の再集計で補正する）
+    """
+    # write_behindで未書き込みのメッセージはchatsに無くカウンターにだけ反映されているため、書き込み終わるまで補正しない
+    if chat_message_writer.has_pending(user_id):
+        logger.info(f"未書き込みのチャットメッセージがあるため再集計をスキップしました: user_id={user_id}")
+        return await _find_user_chat_counters(mongodb, user_id)
+
+    collections = mongodb[COLLECTION_NAME]
+    observed = {
+        (counter["scope"], counter["character_id"]): counter
+        for counter in await _find_user_chat_counters(mongodb, user_id)
+    }
+
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": "$character_id", "count": {"$sum": 1}, "last_chat_date": {"$max": "$timestamp"}}},
+    ]
+    results = await mongodb["chats"].aggregate(pipeline).to_list(length=None)
+    now = datetime.utcnow()
+
+    counters = [
+        {"scope": SCOPE_CHARACTER, "character_id": result["_id"], "count": result["count"], "last_chat_date": result["last_chat_date"]}
+        for result in results
+    ]
+    dates = [counter["last_chat_date"] for counter in counters if counter["last_chat_date"]]
+    counters.append({
+        "scope": SCOPE_USER,
+        "character_id": None,
+        "count": sum(counter["count"] for counter in counters),
+        "last_chat_date": max(dates) if dates else None,
+    })
+
+    async def apply(counter: Dict[str, Any]) -> bool:
+        key = {"user_id": user_id, "scope": counter["scope"], "character_id": counter["character_id"]}
+        current = observed.get((counter["scope"], counter["character_id"]))
+        if current is None:
+            # 集計中にチャットの保存でカウンターが作られていた場合は何もしない
+            try:
+                result = await collections.update_one(
+                    key,
+                    {"$setOnInsert": {"count": counter["count"], "last_chat_date": counter["last_chat_date"], "reconciled_at": now}},
+                    upsert=True,
+                )
+            except DuplicateKeyError:
+                return False
+            return result.upserted_id is not None
+        result = await collections.update_one(
+            {**key, "count": current["count"]},
+            {
+                "$inc": {"count": counter["count"] - current["count"]},
+                "$max": {"last_chat_date": counter["last_chat_date"]},
+                "$set": {"reconciled_at": now},
+            },
+        )
+        return result.modified_count > 0
+
+    async def remove(counter: Dict[str, Any]) -> bool:
+        # チャットが残っていないキャラクターのカウンターも、集計中にインクリメントされていなければ削除
+        result = await collections.delete_one({
+            "user_id": user_id, "scope": SCOPE_CHARACTER, "character_id": counter["character_id"], "count": counter["count"],
+        })
+        return result.deleted_count > 0
+
+    aggregated = {counter["character_id"] for counter in counters if counter["scope"] == SCOPE_CHARACTER}
+    stale = [
+        counter for (scope, character_id), counter in observed.items()
+        if scope == SCOPE_CHARACTER and character_id not in aggregated
+    ]
+    applied = await asyncio.gather(*(apply(counter) for counter in counters), *(remove(counter) for counter in stale))
+
+    logger.info(
+        f"チャットのカウンターを再集計しました: user_id={user_id}, characters={len(counters) - 1}, "
+        f"skipped={applied.count(False)}"
+    )
+    return await _find_user_chat_counters(mongodb, user_id)
+
+
+async def _find_user_chat_counters(mongodb: AsyncIOMotorDatabase, user_id: int) -> List[Dict[str, Any]]:
+    return await mongodb[COLLECTION_NAME].find({"user_id": user_id}, projection={"_id": 0}).to_list(length=None)
+
+
+async def get_user_chat_counters(mongodb: AsyncIOMotorDatabase, user_id: int) -> List[Dict[str, Any]]:
+    """
+    ユーザーのカウンター（ユーザー全体とキャラクターごと）を取得する
+    カウンター導入前のチャットは、管理者の再集計（POST /chat/count/reconcile）を実行するまで数えられない
+    """
+    return await _find_user_chat_counters(mongodb, user_id)
+
+
+async def reconcile_all_chat_counters(mongodb: AsyncIOMotorDatabase) -> int:
+    """chatsコレクションに存在する全ユーザーのカウンターを再集計し、対象のユーザー数を返す"""
+    user_ids = await mongodb["chats"].distinct("user_id")
+    for user_id in user_ids:
+        try:
+            await reconcile_user_chat_counters(mongodb, user_id)
+        except Exception as e:
+            logger.error(f"チャットのカウンターの再集計に失敗しました: user_id={user_id}, {e}")
+    logger.info(f"全ユーザーのチャットのカウンターを再集計しました: users={len(user_ids)}")
+    return len(user_ids)
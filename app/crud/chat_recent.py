@@ -0,0 +1,139 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from redis.exceptions import WatchError
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.crud.chat_writer import chat_message_writer
+from app.crud.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+RECENT_BUFFER_REQUESTS = Counter(
+    "chat_recent_buffer_requests_total",
+    "直近のチャットメッセージのRedisバッファの参照数",
+    labelnames=("result",),
+)
+
+
+class RecentMessageBuffer:
+    """
+    会話（user_id, character_id）ごとの直近のチャットメッセージをRedisのリストに保持するリングバッファ
+    メッセージ保存時に末尾へ追加して先頭を切り詰め、バッファがない会話はMongoDBから読み込んで作り直す
+    （CHAT_WRITE_MODE=write_behindで未書き込みのメッセージがある会話は、書き込まれるまで作り直さない）
+    リストの長さがsize未満であれば、会話の全メッセージがバッファに入っている
+    """
+
+    def __init__(self, size: int = settings.CHAT_RECENT_BUFFER_SIZE, ttl: int = settings.CHAT_RECENT_BUFFER_TTL):
+        self.size = size
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id: int, character_id: int) -> str:
+        return f"chat:recent:{user_id}:{character_id}"
+
+    @staticmethod
+    def _generation_key(user_id: int, character_id: int) -> str:
+        return f"chat:recent:{user_id}:{character_id}:gen"
+
+    @staticmethod
+    def to_entry(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """MongoDBのドキュメントをバッファに保持する形式に変換"""
+        return {
+            "id": str(doc["_id"]) if doc.get("_id") is not None else None,
+            "role": doc["role"],
+            "content": doc["content"],
+            "timestamp": doc.get("timestamp"),
+        }
+
+    async def append(self, user_id: int, character_id: int, entry: Dict[str, Any]) -> None:
+        """
+        保存したメッセージをバッファの末尾に追加する（バッファがない会話には何もしない）
+        世代番号を進め、並行して作り直し中のバッファがこのメッセージを取りこぼしたまま書き込まれないようにする
+        """
+        key = self._key(user_id, character_id)
+        generation_key = self._generation_key(user_id, character_id)
+        try:
+            async with get_redis_client().pipeline(transaction=True) as pipe:
+                pipe.rpushx(key, json.dumps(entry, ensure_ascii=False))
+                pipe.ltrim(key, -self.size, -1)
+                pipe.expire(key, self.ttl)
+                pipe.incr(generation_key)
+                pipe.expire(generation_key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"直近のチャットメッセージのバッファへの追加に失敗しました: {e}")
+
+    async def _get(self, user_id: int, character_id: int, limit: Optional[int]) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        key = self._key(user_id, character_id)
+        try:
+            async with get_redis_client().pipeline(transaction=False) as pipe:
+                pipe.llen(key)
+                pipe.lrange(key, -limit if limit else 0, -1)
+                length, items = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"直近のチャットメッセージのバッファの取得に失敗しました: {e}")
+            RECENT_BUFFER_REQUESTS.labels(result="error").inc()
+            return None
+
+        if not length:
+            RECENT_BUFFER_REQUESTS.labels(result="miss").inc()
+            return None
+        RECENT_BUFFER_REQUESTS.labels(result="hit").inc()
+        return [json.loads(item) for item in items], length < self.size
+
+    async def _populate(self, user_id: int, character_id: int, generation: Optional[bytes], entries: List[Dict[str, Any]]) -> None:
+        """MongoDBから読み込んだメッセージでバッファを作り直す（読み込み中にメッセージが追加されていた場合は書き込まない）"""
+        if not entries:
+            return
+        if chat_message_writer.has_pending(user_id, character_id):
+            # write_behindで未書き込みのメッセージはMongoDBから読めないため、取りこぼしたバッファを作らない
+            return
+        key = self._key(user_id, character_id)
+        generation_key = self._generation_key(user_id, character_id)
+        try:
+            async with get_redis_client().pipeline(transaction=True) as pipe:
+                await pipe.watch(generation_key)
+                if await pipe.get(generation_key) != generation:
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.rpush(key, *[json.dumps(entry, ensure_ascii=False) for entry in entries])
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except WatchError:
+            logger.info(f"直近のチャットメッセージのバッファの作り直し中にメッセージが追加されました: user_id={user_id}, character_id={character_id}")
+        except Exception as e:
+            logger.warning(f"直近のチャットメッセージのバッファの作り直しに失敗しました: {e}")
+
+    async def read(
+        self, mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int, limit: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        直近のメッセージ（最大limit件、省略時はバッファ全体）を古い順で返す
+        戻り値はメッセージと、会話の全メッセージが含まれているかどうか
+        """
+        cached = await self._get(user_id, character_id, limit)
+        if cached is not None:
+            return cached
+
+        try:
+            generation = await get_redis_client().get(self._generation_key(user_id, character_id))
+        except Exception:
+            generation = None
+        cursor = mongodb["chats"].find(
+            {"user_id": user_id, "character_id": character_id},
+            projection={"_id": 1, "role": 1, "content": 1, "timestamp": 1},
+        ).sort([("timestamp", -1), ("_id", -1)]).limit(self.size)
+        docs = await cursor.to_list(length=self.size)
+        entries = [self.to_entry(doc) for doc in reversed(docs)]
+        await self._populate(user_id, character_id, generation, entries)
+
+        complete = len(entries) < self.size
+        return (entries[-limit:] if limit else entries), complete
+
+
+recent_messages = RecentMessageBuffer()
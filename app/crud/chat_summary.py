@@ -0,0 +1,113 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.core.llm.registry import llm_registry
+from app.core.singleflight import SingleFlight
+from app.crud.conversation_analysis import get_messages_after, to_chat_messages
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "chat_summaries"
+
+summary_flight = SingleFlight()
+
+
+async def get_chat_summary(mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int) -> Optional[Dict[str, Any]]:
+    """
+    ユーザーとキャラクターの会話の要約（要約本文と要約済みメッセージのウォーターマーク）を取得
+    """
+    try:
+        return await mongodb[COLLECTION_NAME].find_one({"user_id": user_id, "character_id": character_id})
+    except Exception as e:
+        logger.error(f"会話の要約の取得に失敗しました: {e}")
+        raise
+
+
+async def save_chat_summary(
+    mongodb: AsyncIOMotorDatabase,
+    user_id: int,
+    character_id: int,
+    previous: Optional[Dict[str, Any]],
+    summary: str,
+    summarized_until: str,
+    summarized_until_id: ObjectId,
+) -> bool:
+    """
+    会話の要約を保存する
+    読み込み時点のウォーターマークを条件に更新し、並行実行で先に更新されていた場合はFalseを返す
+    """
+    collections = mongodb[COLLECTION_NAME]
+    doc = {
+        "user_id": user_id,
+        "character_id": character_id,
+        "summary": summary,
+        "summarized_until": summarized_until,
+        "summarized_until_id": summarized_until_id,
+        "updated_at": datetime.utcnow(),
+    }
+    try:
+        if previous is None:
+            await collections.insert_one(doc)
+            return True
+        result = await collections.update_one(
+            {
+                "_id": previous["_id"],
+                "summarized_until": previous.get("summarized_until"),
+                "summarized_until_id": previous.get("summarized_until_id"),
+            },
+            {"$set": doc},
+        )
+        return result.matched_count == 1
+    except DuplicateKeyError:
+        return False
+    except Exception as e:
+        logger.error(f"会話の要約の保存に失敗しました: {e}")
+        raise
+
+
+async def _refresh_chat_summary(mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int, until: str) -> None:
+    chain = llm_registry.get_summary_chain()
+    state = await get_chat_summary(mongodb, user_id, character_id)
+    # 未要約のメッセージを古い順にCHAT_SUMMARY_MAX_MESSAGES件ずつ畳み込み、畳み込んだ分だけウォーターマークを進める
+    while True:
+        summarized_until = (state or {}).get("summarized_until")
+        if summarized_until and summarized_until >= until:
+            return
+
+        messages = await get_messages_after(
+            mongodb, user_id, character_id, summarized_until, settings.CHAT_SUMMARY_MAX_MESSAGES,
+            before=until, after_id=(state or {}).get("summarized_until_id"),
+        )
+        if not messages:
+            return
+
+        summary = await chain.invoke(to_chat_messages(messages), summary=(state or {}).get("summary", ""))
+        if not await save_chat_summary(
+            mongodb, user_id, character_id, state, summary, messages[-1]["timestamp"], messages[-1]["_id"],
+        ):
+            logger.info(f"会話の要約は並行して更新済みのため保存をスキップしました: user_id={user_id}, character_id={character_id}")
+            return
+        if len(messages) < settings.CHAT_SUMMARY_MAX_MESSAGES:
+            return
+        state = await get_chat_summary(mongodb, user_id, character_id)
+
+
+async def refresh_chat_summary(mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int, until: str) -> None:
+    """
+    要約済みのウォーターマークからuntil（プロンプトに残る最も古いメッセージのtimestamp）より前までのメッセージを、
+    これまでの要約に畳み込んで要約を更新する（プロンプトから溢れたメッセージが出たときにバックグラウンドで呼び出す）
+    同じユーザーとキャラクターの更新が実行中であれば、その完了を待つだけにする
+    """
+    try:
+        await summary_flight.do(
+            f"{user_id}:{character_id}",
+            lambda: _refresh_chat_summary(mongodb, user_id, character_id, until),
+        )
+    except Exception as e:
+        logger.error(f"会話の要約の更新に失敗しました: {e}")
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.db.mongo import get_mongo_database
+
+logger = logging.getLogger(__name__)
+
+# 書き込みモード
+# direct: 呼び出しごとに即時 insert_one する
+# acknowledged: キューに積み、まとめて insert_many した結果を待ってから返す
+# write_behind: キューに積んだ時点で返す（プロセス異常終了時は未書き込み分が失われる）
+#   書き込まれるまではMongoDBから読めないため、未書き込みのメッセージがある会話は直近のメッセージのバッファを作り直さない
+WRITE_MODE_DIRECT = "direct"
+WRITE_MODE_ACKNOWLEDGED = "acknowledged"
+WRITE_MODE_WRITE_BEHIND = "write_behind"
+
+
+class ChatMessageWriter:
+    """チャットメッセージをプロセス内キューに溜め、件数または時間で区切って insert_many で保存するライター"""
+
+    def __init__(
+        self,
+        mode: str = settings.CHAT_WRITE_MODE,
+        batch_size: int = settings.CHAT_WRITE_BATCH_SIZE,
+        flush_interval: float = settings.CHAT_WRITE_FLUSH_INTERVAL,
+        max_queue_size: int = settings.CHAT_WRITE_MAX_QUEUE_SIZE,
+        collection_name: str = "chats",
+    ):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.collection_name = collection_name
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # 会話（user_id, character_id）ごとの未書き込みのメッセージ数
+        self._pending_by_conversation: Dict[Tuple, int] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        """未書き込みのメッセージ数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def has_pending(self, user_id, character_id=None) -> bool:
+        """会話（character_idを省略した場合はユーザーの全ての会話）に未書き込み（キュー内・書き込み中）のメッセージがあるかどうか"""
+        if character_id is None:
+            return any(pending_user_id == user_id for pending_user_id, _ in self._pending_by_conversation)
+        return self._pending_by_conversation.get((user_id, character_id), 0) > 0
+
+    @staticmethod
+    def _conversation(doc: dict) -> Tuple:
+        return doc.get("user_id"), doc.get("character_id")
+
+    async def start(self) -> None:
+        """バックグラウンドのフラッシュ処理を開始（アプリ起動時に呼び出す）"""
+        if self.mode == WRITE_MODE_DIRECT or self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"チャットメッセージライターを開始しました: mode={self.mode}, batch_size={self.batch_size}, flush_interval={self.flush_interval}")
+
+    async def stop(self) -> None:
+        """キューに残っているメッセージを全て書き込んでから停止（アプリ終了時に呼び出す）"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("チャットメッセージライターを停止しました")
+
+    async def write(self, doc: dict) -> ObjectId:
+        """
+        チャットメッセージを書き込む
+        _id はクライアント側で採番するため、write_behind でも即座にIDを返せる
+        """
+        doc.setdefault("_id", ObjectId())
+
+        if not self.running:
+            # ライター未起動（directモード・スクリプト実行時など）は即時書き込み
+            await get_mongo_database()[self.collection_name].insert_one(doc)
+            return doc["_id"]
+
+        conversation = self._conversation(doc)
+        self._pending_by_conversation[conversation] = self._pending_by_conversation.get(conversation, 0) + 1
+        future = None if self.mode == WRITE_MODE_WRITE_BEHIND else asyncio.get_running_loop().create_future()
+        try:
+            await self._queue.put((doc, future))
+        except BaseException:
+            self._release(doc)
+            raise
+
+        if future is not None:
+            await future
+        return doc["_id"]
+
+    def _release(self, doc: dict) -> None:
+        conversation = self._conversation(doc)
+        count = self._pending_by_conversation.get(conversation, 0) - 1
+        if count > 0:
+            self._pending_by_conversation[conversation] = count
+        else:
+            self._pending_by_conversation.pop(conversation, None)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # 停止要求後に残っているメッセージを書き込む
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+
+    async def _flush(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]) -> None:
+        """
+        まとめて保存し、各メッセージの結果を呼び出し元へ返す
+        ordered=Falseのため一部が失敗しても残りは保存されるので、失敗したメッセージだけを失敗として返す
+        """
+        docs = [doc for doc, _ in batch]
+        errors: Dict[int, Exception] = {}
+        try:
+            await get_mongo_database()[self.collection_name].insert_many(docs, ordered=False)
+            logger.info(f"チャットメッセージをまとめて保存しました: count={len(docs)}")
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                errors[write_error["index"]] = BulkWriteError({"writeErrors": [write_error]})
+            logger.error(f"チャットメッセージのまとめて保存で一部が失敗しました: count={len(docs)}, failed={len(errors)}, error={e}")
+        except Exception as e:
+            errors = {index: e for index in range(len(docs))}
+            logger.error(f"チャットメッセージのまとめて保存に失敗しました: count={len(docs)}, error={e}")
+        finally:
+            for doc in docs:
+                self._release(doc)
+
+        for index, (_, future) in enumerate(batch):
+            if future is None or future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(None)
+
+
+chat_message_writer = ChatMessageWriter()
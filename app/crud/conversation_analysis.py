@@ -0,0 +1,190 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.core.llm.chain.jschema import SCHEMA_CNVERSATION_ANALYSIS
+from app.crud.chat_recent import recent_messages
+from app.schemas.chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "conversation_analysis_states"
+
+# 分析結果として返す語句の最大数（会話分析の出力スキーマに合わせる）
+MAX_MATCHED_WORDS = json.loads(SCHEMA_CNVERSATION_ANALYSIS)["properties"]["matched_words"]["maxItems"]
+
+
+async def get_analysis_state(mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int) -> Optional[Dict[str, Any]]:
+    """
+    ユーザーとキャラクターの会話分析の状態（累積結果と分析済みメッセージのウォーターマーク）を取得
+    """
+    try:
+        return await mongodb[COLLECTION_NAME].find_one({"user_id": user_id, "character_id": character_id})
+    except Exception as e:
+        logger.error(f"会話分析の状態の取得に失敗しました: {e}")
+        raise
+
+
+def is_after(timestamp: Optional[str], message_id: Any, after: Optional[str], after_id: Optional[ObjectId] = None) -> bool:
+    """
+    メッセージがウォーターマーク（timestamp, _id）より後かどうか
+    timestampが同じメッセージは_idで順序を決める（_idを持たない古いウォーターマークはtimestampだけで比較する）
+    """
+    if not after:
+        return True
+    if not timestamp:
+        return False
+    if timestamp != after:
+        return timestamp > after
+    return after_id is not None and message_id is not None and ObjectId(message_id) > after_id
+
+
+async def get_messages_after(
+    mongodb: AsyncIOMotorDatabase,
+    user_id: int,
+    character_id: int,
+    after: Optional[str],
+    limit: int,
+    before: Optional[str] = None,
+    after_id: Optional[ObjectId] = None,
+) -> List[Dict[str, Any]]:
+    """
+    ウォーターマーク（timestamp, _id）より後のチャットメッセージを (timestamp, _id) の古い順で最大limit件取得
+    beforeを指定した場合はそのtimestampより前のメッセージに限る
+    件数がlimitを超える場合は古い方からlimit件を返すため、呼び出し側は最後のメッセージの timestamp と _id をウォーターマークとして続きを取得する
+    （同じtimestampのメッセージがlimitの境界をまたいでも、_idで続きから取得できる）
+    対象のメッセージが全て直近のメッセージのバッファに含まれる場合はMongoDBを参照しない
+    """
+    if settings.CHAT_RECENT_BUFFER_ENABLED:
+        buffered, complete = await recent_messages.read(mongodb, user_id, character_id)
+        buffered = sorted(
+            ({"_id": ObjectId(msg["id"]), "role": msg["role"], "content": msg["content"], "timestamp": msg["timestamp"]}
+             for msg in buffered if msg.get("id") and msg.get("timestamp")),
+            key=lambda msg: (msg["timestamp"], msg["_id"]),
+        )
+        in_range = [
+            msg for msg in buffered
+            if is_after(msg["timestamp"], msg["_id"], after, after_id) and (not before or msg["timestamp"] < before)
+        ]
+        # バッファは会話の末尾の連続した区間のため、会話全体が入っているかウォーターマークまで遡れる場合のみ、
+        # ウォーターマーク直後からのメッセージをバッファから求められる
+        if complete or (after and buffered and not is_after(buffered[0]["timestamp"], buffered[0]["_id"], after, after_id)):
+            return in_range[:limit]
+
+    try:
+        query: Dict[str, Any] = {"user_id": user_id, "character_id": character_id}
+        timestamp: Dict[str, Any] = {}
+        if after and after_id is not None:
+            query["$or"] = [{"timestamp": {"$gt": after}}, {"timestamp": after, "_id": {"$gt": after_id}}]
+        elif after:
+            timestamp["$gt"] = after
+        if before:
+            timestamp["$lt"] = before
+        if timestamp:
+            query["timestamp"] = timestamp
+        cursor = mongodb["chats"].find(
+            query,
+            projection={"_id": 1, "role": 1, "content": 1, "timestamp": 1},
+        ).sort([("timestamp", 1), ("_id", 1)]).limit(limit)
+        return await cursor.to_list(length=limit)
+    except Exception as e:
+        logger.error(f"未分析のチャットメッセージの取得に失敗しました: {e}")
+        raise
+
+
+def merge_analysis(state: Optional[Dict[str, Any]], result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    累積済みの分析結果に新しい分析結果をマージする
+    (word, type) が同じ語句は出現回数を加算し、理由は新しい方で上書きする
+    語句は出現回数の多い順にMAX_MATCHED_WORDS件までに絞り、total_matched_countは絞る前の全ての出現回数から求める
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for word in (state or {}).get("matched_words", []):
+        merged[(word["word"], word["type"])] = dict(word)
+
+    # 上位に残らなかった語句の出現回数も含めるため、合計は累積済みの合計に今回の出現回数を加算して求める
+    total_matched_count = (state or {}).get("total_matched_count", 0)
+    for word in result.get("matched_words", []):
+        key = (word.get("word"), word.get("type"))
+        if not key[0]:
+            continue
+        count = int(word.get("count_in_message") or 1)
+        total_matched_count += count
+        if key in merged:
+            merged[key]["count_in_message"] += count
+            merged[key]["reason"] = word.get("reason", merged[key]["reason"])
+        else:
+            merged[key] = {
+                "word": key[0],
+                "type": key[1],
+                "reason": word.get("reason", ""),
+                "count_in_message": count,
+            }
+
+    matched_words = sorted(merged.values(), key=lambda word: word["count_in_message"], reverse=True)
+    return {
+        "matched_words": matched_words[:MAX_MATCHED_WORDS],
+        "total_matched_count": total_matched_count,
+    }
+
+
+async def save_analysis_state(
+    mongodb: AsyncIOMotorDatabase,
+    user_id: int,
+    character_id: int,
+    previous: Optional[Dict[str, Any]],
+    analysis: Dict[str, Any],
+    last_timestamp: str,
+    last_id: ObjectId,
+) -> bool:
+    """
+    会話分析の状態を保存する
+    読み込み時点のウォーターマークを条件に更新し、並行実行で先に更新されていた場合はFalseを返す
+    """
+    collections = mongodb[COLLECTION_NAME]
+    doc = {
+        "user_id": user_id,
+        "character_id": character_id,
+        "matched_words": analysis["matched_words"],
+        "total_matched_count": analysis["total_matched_count"],
+        "last_timestamp": last_timestamp,
+        "last_id": last_id,
+        "updated_at": datetime.utcnow(),
+    }
+    try:
+        if previous is None:
+            await collections.insert_one(doc)
+            return True
+        result = await collections.update_one(
+            {"_id": previous["_id"], "last_timestamp": previous.get("last_timestamp"), "last_id": previous.get("last_id")},
+            {"$set": doc},
+        )
+        return result.matched_count == 1
+    except DuplicateKeyError:
+        return False
+    except Exception as e:
+        logger.error(f"会話分析の状態の保存に失敗しました: {e}")
+        raise
+
+
+def to_analysis_result(state: Optional[Dict[str, Any]], stale: bool = False) -> Dict[str, Any]:
+    """
+    保存済みの状態をAPIの返却形式に変換
+    staleは未分析のメッセージが残っていて、会話全体を反映しきれていない結果かどうか
+    """
+    state = state or {}
+    return {
+        "matched_words": state.get("matched_words", []),
+        "total_matched_count": state.get("total_matched_count", 0),
+        "stale": stale,
+    }
+
+
+def to_chat_messages(messages: List[Dict[str, Any]]) -> List[ChatMessage]:
+    return [ChatMessage(role=msg["role"], content=msg["content"]) for msg in messages]
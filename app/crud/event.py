@@ -15,14 +15,7 @@ async def save_event(mongodb: AsyncIOMotorDatabase, user_id: str, character_id:
     evemt_type: "level_up", "relationship_change", "item_acquired"
     """
     try:
-
-        # eventsのコレクションが存在しない場合は作成
-        try:
-            collections = await mongodb.create_collection("events")
-            logger.info("コレクション 'events' を作成しました。")
-        except Exception as e:
-            logger.info(f"コレクション 'events' は既に存在します: {e}")
-
+        # コレクションは最初の挿入時に自動で作成される
         collections = mongodb["events"]
 
         insert_data = {
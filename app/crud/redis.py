@@ -5,6 +5,35 @@ from typing import Optional, Tuple
 import redis.asyncio as redis
 
 from app.core.config import settings
+from app.core.metrics import Counter
+
+IMAGE_CACHE_REQUESTS = Counter(
+    "image_cache_requests_total",
+    "Redis画像キャッシュの参照数",
+    labelnames=("result",),
+)
+
+# プロセス内で共有するRedisクライアント（接続プールを再利用する）
+_redis_client: Optional[redis.Redis] = None
+
+
+def get_redis_client() -> redis.Redis:
+    """共有Redisクライアントを取得（未作成なら作成）"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=False  # バイナリデータのためFalse
+        )
+    return _redis_client
+
+
+async def close_redis_client() -> None:
+    """共有Redisクライアントを閉じる（アプリ終了時に呼び出す）"""
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+    _redis_client = None
 
 
 class RedisCacheService:
@@ -80,15 +109,18 @@ class RedisCacheService:
             cached_data = await self.redis_client.get(cache_key)
             
             if not cached_data:
+                IMAGE_CACHE_REQUESTS.labels(result="miss").inc()
                 return None
             
             cache_value = json.loads(cached_data)
             image_data = base64.b64decode(cache_value["data"])
             content_type = cache_value["content_type"]
             
+            IMAGE_CACHE_REQUESTS.labels(result="hit").inc()
             return image_data, content_type
         except Exception as e:
             print(f"Redis get error: {e}")
+            IMAGE_CACHE_REQUESTS.labels(result="error").inc()
             return None
     
     async def cache_exists(self, file_path: str) -> bool:
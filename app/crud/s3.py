@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 import aioboto3
 from botocore.exceptions import ClientError
@@ -82,6 +82,47 @@ class StorageService:
                     raise FileNotFoundError(f"File not found: {path}")
                 raise
     
+    async def put_bytes(self, path: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        """バイト列をそのまま保存する
+        
+        Args:
+            path: 保存先のパス
+            data: 保存する内容
+            content_type: MIMEタイプ
+        """
+        async with self.session.client('s3', endpoint_url=self.endpoint_url) as s3:
+            await s3.put_object(
+                Bucket=self.bucket_name,
+                Key=path,
+                Body=data,
+                ContentType=content_type
+            )
+
+    async def stream_file(self, path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """ファイル全体をメモリに読み込まずにchunk_sizeずつ返す
+        
+        Args:
+            path: ファイルのパス
+            chunk_size: 1回に返す最大バイト数
+            
+        Raises:
+            FileNotFoundError: ファイルが見つからない場合（最初のチャンクを取得する時点で送出される）
+        """
+        async with self.session.client('s3', endpoint_url=self.endpoint_url) as s3:
+            try:
+                response = await s3.get_object(Bucket=self.bucket_name, Key=path)
+            except ClientError as e:
+                error_code = e.response.get('Error', {}).get('Code')
+                if error_code == 'NoSuchKey':
+                    raise FileNotFoundError(f"File not found: {path}")
+                raise
+            async with response['Body'] as stream:
+                while True:
+                    chunk = await stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
     async def delete_file(self, path: str) -> bool:
         """ファイルを削除する
         
@@ -1,14 +1,30 @@
+import asyncio
 import logging
 from datetime import datetime
-from typing import Any
+from typing import Any, AsyncIterator, List, Optional, Tuple
 
+from bson import ObjectId
+from bson.errors import InvalidId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from sqlalchemy.orm import Session
 
 from app.core.aws.bedrock_client import BedrockClient
-from app.core.llm.chain.chatchain import ChatChain, ConversationAnalysisChain, PositiveAnalysisChain
+from app.core.config import settings
+from app.core.llm.registry import llm_registry
 from app.core.tasuki.tasuki_client import TasukiClient
-from app.schemas.chat import ChatCount, ChatMessage, ChatOutput
+from app.core.timing import StageTimer
+from app.crud.analysis_cache import analysis_cache
+from app.crud.chat_counters import SCOPE_CHARACTER, SCOPE_USER, get_user_chat_counters, increment_chat_counters
+from app.crud.chat_recent import recent_messages
+from app.crud.chat_writer import chat_message_writer
+from app.crud.conversation_analysis import (
+    get_analysis_state,
+    get_messages_after,
+    merge_analysis,
+    save_analysis_state,
+    to_analysis_result,
+    to_chat_messages,
+)
+from app.schemas.chat import ChatCount, ChatMessage, ChatOutput, ChatStreamEvent
 from app.schemas.tasuki import TasukiAuthCheckOutput
 
 logger = logging.getLogger(__name__)
@@ -25,10 +41,7 @@ class TasukiService:
         """
         if not project_id:
             raise ValueError("プロジェクトIDが指定されていません。")
-        chat_llm = self.tasuki_client.get_chat_model(project_id)
-        self.chain = ChatChain(
-            chat_llm=chat_llm,
-        )
+        self.chain = llm_registry.get_chat_chain(project_id)
 
     async def check_auth(self) -> TasukiAuthCheckOutput:
         """
@@ -42,12 +55,12 @@ class TasukiService:
             raise TasukiAuthCheckOutput(status_code="500", message=f"TASUKI認証チェックに失敗しました。APIキーの設定を確認してください。str{e}")
         
     
-    async def chat(self, inputs, character) -> ChatOutput:
+    async def chat(self, inputs, character, summary: str = "") -> ChatOutput:
         """
         TASUKIプロジェクトでチャットを実行するメソッド
         """
         try:
-            result = self.chain.invoke(inputs, character)
+            result = await self.chain.ainvoke(inputs, character, summary=summary)
             return ChatOutput(
                 response=result.content,
                 role=result.response_metadata.get("role", "assistant"),
@@ -55,12 +68,30 @@ class TasukiService:
             )
         except Exception as e:
             logger.error(f"TASUKIチャットに失敗しました: {e}")
-            raise ChatOutput(
-                response=f"TASUKIチャットに失敗しました。{str(e)}",
-                role="assistant",
-                chunks=[]
-            )
+            raise
         
+    async def chat_stream(self, inputs, character, summary: str = "") -> AsyncIterator[ChatStreamEvent]:
+        """
+        TASUKIプロジェクトでチャットをストリーミング実行するメソッド
+        deltaを受信するたびにイベントを返し、最後に組み立て済みのメッセージを返す
+        """
+        contents = []
+        chunks = []
+        async for chunk in self.chain.astream(inputs, character, summary=summary):
+            metadata = chunk.response_metadata or {}
+            if metadata.get("chunks"):
+                chunks = metadata["chunks"]
+            if chunk.content:
+                contents.append(chunk.content)
+                yield ChatStreamEvent(type="delta", content=chunk.content)
+
+        yield ChatStreamEvent(
+            type="done",
+            role="assistant",
+            response="".join(contents),
+            chunks=chunks,
+        )
+
 class ConversationAnalysisService:
     def __init__(self, 
             tasuki_client: TasukiClient,
@@ -77,22 +108,63 @@ class ConversationAnalysisService:
         """
         if not project_id:
             raise ValueError("プロジェクトIDが指定されていません。")
-        chat_llm = self.tasuki_client.get_chat_model(project_id)
-        self.chain = ConversationAnalysisChain(
-            chat_llm=chat_llm,
-        ) 
+        self.chain = llm_registry.get_conversation_analysis_chain(project_id)
     
-    async def check(self, inputs, db: Session, mongodb: AsyncIOMotorDatabase) -> Any:
+    async def check(self, history: List[ChatMessage]) -> Any:
         """
         TASUKIプロジェクトで語句分析を実行するメソッド
         """
         try:
-            result = await self.chain.invoke(inputs, db=db, mongodb=mongodb)
+            result = await self.chain.invoke(history)
             return result
         except Exception as e:
             logger.error(f"TASUKIチャットに失敗しました: {e}")
             raise 
 
+    async def check_incremental(
+        self, mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int, max_batches: Optional[int] = None,
+    ) -> Any:
+        """
+        前回の分析以降に追加されたメッセージだけを語句分析し、保存済みの累積結果にマージして返すメソッド
+        未分析のメッセージは古い順にCONVERSATION_ANALYSIS_WINDOW件ずつ分析し、マージした分だけウォーターマークを進める
+        max_batches回分析しても未分析のメッセージが残る場合は、そこまでの累積結果をstale=Trueとして返す
+        （省略時は未分析のメッセージを全て取り込むまで繰り返すため、初回や分析が途切れていた会話は分析ジョブから呼び出す）
+        新しいメッセージがなければLLMを呼び出さずに累積結果を返す
+        """
+        state = await get_analysis_state(mongodb, user_id, character_id)
+        batches = 0
+        while True:
+            messages = await get_messages_after(
+                mongodb, user_id, character_id,
+                after=state.get("last_timestamp") if state else None,
+                limit=settings.CONVERSATION_ANALYSIS_WINDOW,
+                after_id=state.get("last_id") if state else None,
+            )
+            if not messages:
+                return to_analysis_result(state)
+            if max_batches is not None and batches >= max_batches:
+                logger.info(f"未分析のメッセージが残っているため途中までの会話分析の結果を返します: user_id={user_id}, character_id={character_id}")
+                return to_analysis_result(state, stale=True)
+
+            result = await self.check(to_chat_messages(messages))
+            merged = merge_analysis(state, result)
+            batches += 1
+
+            saved = await save_analysis_state(
+                mongodb, user_id, character_id,
+                previous=state,
+                analysis=merged,
+                last_timestamp=messages[-1]["timestamp"],
+                last_id=messages[-1]["_id"],
+            )
+            if not saved:
+                # 並行して実行された分析が先に同じメッセージを反映したため、その結果を返す
+                logger.info(f"会話分析の状態が他のリクエストで更新されていました: user_id={user_id}, character_id={character_id}")
+                return to_analysis_result(await get_analysis_state(mongodb, user_id, character_id))
+            if len(messages) < settings.CONVERSATION_ANALYSIS_WINDOW:
+                return to_analysis_result(merged)
+            state = await get_analysis_state(mongodb, user_id, character_id)
+
 class PositiveAnalysisService:
     def __init__(self, 
             bedrock_client: BedrockClient,
@@ -105,22 +177,65 @@ class PositiveAnalysisService:
         """
         Bedrockをセットアップ
         """
-        chat_llm = self.bedrock_client.get_client()
-        self.chain = PositiveAnalysisChain(
-            chat_llm=chat_llm,
-        )
+        self.chain = llm_registry.get_positive_analysis_chain(self.bedrock_client.model_id)
 
-    async def check(self, inputs, db: Session, mongodb: AsyncIOMotorDatabase):
+    async def check(self, history: List[ChatMessage]):
         """
         Bedrockでポジティブ分析を実行するメソッド
         """
         try:
-            result = await self.chain.invoke(inputs, db=db, mongodb=mongodb)
+            result = await self.chain.invoke(history)
             return result
         except Exception as e:
             logger.error(f"TASUKIチャットに失敗しました: {e}")
             raise 
 
+async def analyze_conversation(
+    mongodb: AsyncIOMotorDatabase,
+    conversation_analysis: ConversationAnalysisService,
+    bedrock_service: PositiveAnalysisService,
+    user_id: int,
+    character_id: int,
+    timer: Optional[StageTimer] = None,
+    max_batches: Optional[int] = None,
+) -> dict:
+    """
+    ユーザーとキャラクターの会話に対して語句分析とポジティブ分析を実行する
+    同期エンドポイントと会話分析ジョブのワーカーの両方から呼び出す
+    max_batchesは語句分析で1回に取り込む未分析メッセージの回数の上限（同期エンドポイントの応答時間を抑えるために指定する）
+    """
+    timer = timer or StageTimer("conversation_analysis")
+
+    # 直近の会話履歴を一度だけ取得し、2つの分析チェーンで共有する
+    history = await timer.measure("history", get_recent_chat_messages(
+        mongodb,
+        user_id=user_id,
+        character_id=character_id,
+        limit=settings.CONVERSATION_ANALYSIS_WINDOW,
+    ), provider="mongo")
+
+    # 2つの分析は互いに独立しているため並行して実行する
+    # 分析対象のメッセージが前回と同じ場合はキャッシュ済みの結果を返す
+    # 語句分析は前回分析以降のメッセージだけを分析し、会話全体の累積結果を返す
+    conversation_analysis_result, positive = await asyncio.gather(
+        analysis_cache.get_or_compute(
+            "conversation", user_id, character_id, history,
+            lambda: timer.measure(
+                "conversation", conversation_analysis.check_incremental(mongodb, user_id, character_id, max_batches=max_batches),
+                provider="tasuki",
+            ),
+        ),
+        analysis_cache.get_or_compute(
+            "positive", user_id, character_id, history,
+            lambda: timer.measure("positive", bedrock_service.check(history), provider="bedrock"),
+        ),
+    )
+
+    return {
+        "conversation_analysis": conversation_analysis_result,
+        "positive_analysis": positive
+    }
+
 async def get_chat_history(mongodb: AsyncIOMotorDatabase, user_id: str, character_id: str):
     """
     ユーザーの特定キャラクターとのチャット履歴を取得するヘルパーメソッド
@@ -130,14 +245,17 @@ async def get_chat_history(mongodb: AsyncIOMotorDatabase, user_id: str, characte
         collections = mongodb["chats"]
 
         # ユーザーのチャット履歴を取得
-        chat_history = await collections.find({"user_id": user_id, "character_id": character_id}).to_list(length=None)
+        chat_history = await collections.find(
+            {"user_id": user_id, "character_id": character_id},
+            projection=CHAT_MESSAGE_PROJECTION,
+        ).to_list(length=None)
 
         if not chat_history:
             logger.info(f"チャット履歴が見つかりません: user_id={user_id}, character_id={character_id}")
             return []
 
-        # チャットメッセージをChatMessageモデルに変換
-        messages = [ChatMessage(**msg) for msg in chat_history]
+        # チャットメッセージをChatMessageモデルに変換（_idはページングと同じくidとして返す）
+        messages = [_to_chat_message(msg) for msg in chat_history]
 
         logger.info(f"チャット履歴を取得しました: user_id={user_id}, character_id={character_id}, count={len(messages)}")
         return messages
@@ -146,6 +264,102 @@ async def get_chat_history(mongodb: AsyncIOMotorDatabase, user_id: str, characte
         logger.error(f"チャット履歴の取得に失敗しました: {e}")
         raise
     
+async def get_recent_chat_messages(mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int, limit: int) -> List[ChatMessage]:
+    """
+    ユーザーの特定キャラクターとの直近のチャットメッセージを古い順で取得するヘルパーメソッド
+    timestamp降順でlimit件だけ取得し、role/content/timestampのみを射影する
+    limit件が直近のメッセージのバッファに収まる場合はRedisから取得する
+    """
+    try:
+        if settings.CHAT_RECENT_BUFFER_ENABLED and limit <= recent_messages.size:
+            entries, _ = await recent_messages.read(mongodb, user_id, character_id, limit=limit)
+            return [ChatMessage(**entry) for entry in entries]
+
+        collections = mongodb["chats"]
+        cursor = collections.find(
+            {"user_id": user_id, "character_id": character_id},
+            projection={"_id": 0, "role": 1, "content": 1, "timestamp": 1},
+        ).sort("timestamp", -1).limit(limit)
+        recent = await cursor.to_list(length=limit)
+
+        messages = [ChatMessage(**msg) for msg in reversed(recent)]
+        logger.info(f"直近のチャット履歴を取得しました: user_id={user_id}, character_id={character_id}, count={len(messages)}")
+        return messages
+    except Exception as e:
+        logger.error(f"直近のチャット履歴の取得に失敗しました: {e}")
+        raise
+
+CHAT_MESSAGE_PROJECTION = {"_id": 1, "role": 1, "content": 1, "timestamp": 1}
+
+
+def _to_chat_message(doc: dict) -> ChatMessage:
+    return ChatMessage(id=str(doc["_id"]), role=doc["role"], content=doc["content"], timestamp=doc.get("timestamp"))
+
+
+def _parse_cursor(cursor: str) -> ObjectId:
+    try:
+        return ObjectId(cursor)
+    except (InvalidId, TypeError):
+        raise ValueError(f"不正なカーソルです: {cursor}")
+
+
+async def get_chat_messages_page(
+    mongodb: AsyncIOMotorDatabase,
+    user_id: int,
+    character_id: int,
+    limit: int,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> Tuple[List[ChatMessage], bool]:
+    """
+    チャット履歴をメッセージIDによるキーセットページングで取得するヘルパーメソッド
+    before指定時（または指定なし）はそれより古いメッセージを新しい順にlimit件、after指定時はそれより新しいメッセージを古い順にlimit件取得する
+    戻り値はページ内のメッセージ（古い順）と、同じ方向にまだメッセージがあるかどうか
+    """
+    if before and after:
+        raise ValueError("beforeとafterは同時に指定できません")
+
+    # 最新のページはバッファに収まる場合はRedisから取得する
+    if not before and not after and settings.CHAT_RECENT_BUFFER_ENABLED and limit + 1 <= recent_messages.size:
+        entries, _ = await recent_messages.read(mongodb, user_id, character_id, limit=limit + 1)
+        return [ChatMessage(**entry) for entry in entries[-limit:]], len(entries) > limit
+
+    query = {"user_id": user_id, "character_id": character_id}
+    direction = -1
+    if before:
+        query["_id"] = {"$lt": _parse_cursor(before)}
+    elif after:
+        query["_id"] = {"$gt": _parse_cursor(after)}
+        direction = 1
+
+    try:
+        # 1件多く取得して次のページの有無を判定する
+        cursor = mongodb["chats"].find(query, projection=CHAT_MESSAGE_PROJECTION).sort("_id", direction).limit(limit + 1)
+        docs = await cursor.to_list(length=limit + 1)
+    except Exception as e:
+        logger.error(f"チャット履歴のページの取得に失敗しました: {e}")
+        raise
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction == -1:
+        docs.reverse()
+    return [_to_chat_message(doc) for doc in docs], has_more
+
+
+async def iter_chat_messages(
+    mongodb: AsyncIOMotorDatabase, user_id: int, character_id: int, batch_size: int = 500
+) -> AsyncIterator[ChatMessage]:
+    """チャット履歴の全件を古い順に、カーソルからbatch_size件ずつ読みながら返す（エクスポート用）"""
+    cursor = mongodb["chats"].find(
+        {"user_id": user_id, "character_id": character_id},
+        projection=CHAT_MESSAGE_PROJECTION,
+        batch_size=batch_size,
+    ).sort("_id", 1)
+    async for doc in cursor:
+        yield _to_chat_message(doc)
+
+
 async def save_chat_message(mongodb: AsyncIOMotorDatabase, user_id: str, character_id: str, role: str, content: str) -> Any:
     """
     チャットメッセージをMongoDB に保存するヘルパーメソッド
@@ -166,10 +380,27 @@ async def save_chat_message(mongodb: AsyncIOMotorDatabase, user_id: str, charact
         logger.info(f"チャットメッセージを保存します: user_id={user_id}, character_id={character_id}, content={content}")
 
         # ユーザーのチャットメッセージを保存
-        result = await collections.insert_one(chat_doc)
+        if chat_message_writer.running:
+            # ライター起動中はキュー経由でまとめて保存する（CHAT_WRITE_MODE）
+            inserted_id = await chat_message_writer.write(chat_doc)
+        else:
+            result = await collections.insert_one(chat_doc)
+            inserted_id = result.inserted_id
         
-        logger.info(f"チャットメッセージを保存しました: user_id={user_id}, character_id={character_id}, message_id={result.inserted_id}")
-        return result.inserted_id
+        logger.info(f"チャットメッセージを保存しました: user_id={user_id}, character_id={character_id}, message_id={inserted_id}")
+
+        if settings.CHAT_RECENT_BUFFER_ENABLED:
+            await recent_messages.append(user_id, character_id, recent_messages.to_entry({**chat_doc, "_id": inserted_id}))
+
+        # 件数の集計はカウンターで行う（失敗しても再集計で補正できるため保存自体は成功とする）
+        try:
+            await increment_chat_counters(mongodb, user_id, character_id, chat_doc["timestamp"])
+        except Exception as e:
+            logger.error(f"チャットのカウンターの更新に失敗しました: user_id={user_id}, character_id={character_id}, {e}")
+
+        # 会話が更新されたため分析結果のキャッシュを破棄
+        await analysis_cache.invalidate(user_id, character_id)
+        return inserted_id
     except Exception as e:
         logger.error(f"チャットメッセージの保存に失敗しました: {e}")
         raise
@@ -186,8 +417,12 @@ async def get_chat_count(mongodb: AsyncIOMotorDatabase, user_id: str, character_
     ユーザーの特定キャラクターとのチャットメッセージ数を取得するヘルパーメソッド
     """
     try:
-        collections = mongodb["chats"]
-        count = await collections.count_documents({"user_id": user_id, "character_id": character_id})
+        counters = await get_user_chat_counters(mongodb, user_id)
+        count = next(
+            (counter["count"] for counter in counters
+             if counter["scope"] == SCOPE_CHARACTER and counter["character_id"] == character_id),
+            0,
+        )
         logger.info(f"チャットメッセージ数を取得しました: user_id={user_id}, character_id={character_id}, count={count}")
         return count
     except Exception as e:
@@ -199,9 +434,8 @@ async def get_all_chat_count(mongodb: AsyncIOMotorDatabase, user_id: str) -> int
     ユーザーの特定キャラクターとの全チャットメッセージを取得するヘルパーメソッド
     """
     try:
-        collections = mongodb["chats"]
-        count = await collections.count_documents({"user_id": user_id})
-        print(f"全チャットメッセージ数を取得しました: user_id={user_id}, count={count}")
+        counters = await get_user_chat_counters(mongodb, user_id)
+        count = next((counter["count"] for counter in counters if counter["scope"] == SCOPE_USER), 0)
         logger.info(f"全チャットメッセージ数を取得しました: user_id={user_id}, count={count}")
         return count
 
@@ -216,39 +450,22 @@ async def get_all_chat_count_by_character(
     ユーザーの全てのキャラクターごとのチャットメッセージ数を取得するヘルパーメソッド
     """
     try:
-        collections = mongodb["chats"]
-        pipeline = [
-            {"$match": {"user_id": user_id}},
-            {
-                "$group": {
-                    "_id": "$character_id",
-                    "count": {"$sum": 1},
-                    "last_chat_date": {"$max": "$timestamp"},
-                }
-            },
-            {
-                "$project": {
-                    "character_id": "$_id",
-                    "count": 1,
-                    "last_chat_date": 1,
-                    "_id": 0,
-                }
-            },
-        ]
-        results = await collections.aggregate(pipeline).to_list(length=None)
+        counters = await get_user_chat_counters(mongodb, user_id)
 
         chat_counts = []
-        for result in results:
+        for counter in counters:
+            if counter["scope"] != SCOPE_CHARACTER or counter["count"] <= 0:
+                continue
             last_chat_date_obj = None
-            if result.get("last_chat_date"):
+            if counter.get("last_chat_date"):
                 try:
-                    last_chat_date_obj = datetime.fromisoformat(result["last_chat_date"].replace("Z", "+00:00"))
+                    last_chat_date_obj = datetime.fromisoformat(counter["last_chat_date"].replace("Z", "+00:00"))
                 except ValueError:
-                    logger.warning(f"Could not parse timestamp: {result['last_chat_date']} for character_id: {result['character_id']}")
+                    logger.warning(f"Could not parse timestamp: {counter['last_chat_date']} for character_id: {counter['character_id']}")
             chat_counts.append(
                 ChatCount(
-                    character_id=result["character_id"],
-                    count=result["count"],
+                    character_id=counter["character_id"],
+                    count=counter["count"],
                     last_chat_date=last_chat_date_obj,
                 )
             )
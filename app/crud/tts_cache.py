@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import re
+import unicodedata
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.crud.redis import get_redis_client
+from app.crud.s3 import StorageService
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_REQUESTS = Counter(
+    "tts_cache_requests_total",
+    "音声合成キャッシュの参照数",
+    labelnames=("result",),
+)
+TTS_CACHE_STORES = Counter(
+    "tts_cache_stores_total",
+    "音声合成キャッシュへの保存数",
+    labelnames=("tier",),
+)
+TTS_CACHE_SKIPPED = Counter(
+    "tts_cache_skipped_total",
+    "サイズ上限を超えたためキャッシュしなかった音声の数",
+)
+
+# キャッシュキーの形式を変えた場合は更新する
+CACHE_KEY_VERSION = "v1"
+
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用にテキストを正規化する（NFKC正規化・前後の空白除去・連続する空白を1つにまとめる）"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def tts_cache_key(text: str, voice: str, output_format: str = "mp3", language_code: str = "ja-JP") -> str:
+    """正規化したテキスト・音声・出力形式から内容アドレスのキーを計算する"""
+    payload = "\n".join([CACHE_KEY_VERSION, voice, output_format, language_code, normalize_text(text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSCacheService:
+    """
+    合成済み音声のキャッシュサービス
+    小さい音声はRedis（TTS_CACHE_REDIS_MAX_BYTES以下）、全ての音声はS3に保存する
+    S3に保存済みのキーはRedisに記録し、キャッシュミス時にS3へ問い合わせないようにする
+    （S3側のオブジェクトの削除はバケットのライフサイクルルールに任せる）
+    """
+
+    def __init__(self, storage: StorageService):
+        self.storage = storage
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"tts:audio:{key}"
+
+    @staticmethod
+    def _index_key(key: str) -> str:
+        return f"tts:s3:{key}"
+
+    @staticmethod
+    def _path(key: str) -> str:
+        return f"{settings.TTS_CACHE_S3_PREFIX}/{key[:2]}/{key}.mp3"
+
+    async def get(self, key: str) -> Optional[AsyncIterator[bytes]]:
+        """
+        キャッシュ済みの音声をチャンクのイテレータで返す（なければNone）
+        Redisにあればそのまま、S3にあればストレージから読みながら返す
+        """
+        try:
+            async with get_redis_client().pipeline(transaction=False) as pipe:
+                pipe.get(self._redis_key(key))
+                pipe.exists(self._index_key(key))
+                audio, in_storage = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"音声合成キャッシュの取得に失敗しました: {e}")
+            TTS_CACHE_REQUESTS.labels(result="error").inc()
+            return None
+
+        if audio is not None:
+            TTS_CACHE_REQUESTS.labels(result="hit_redis").inc()
+            return self._iterate(audio)
+
+        if in_storage:
+            stream = self.storage.stream_file(self._path(key))
+            try:
+                # オブジェクトが存在することを確認してから返す
+                first = await stream.__anext__()
+            except (FileNotFoundError, StopAsyncIteration):
+                # ライフサイクルルールなどで削除済みのため記録を消してキャッシュミスとする
+                await stream.aclose()
+                try:
+                    await get_redis_client().delete(self._index_key(key))
+                except Exception as e:
+                    logger.warning(f"音声合成キャッシュの記録の削除に失敗しました: {e}")
+            except Exception as e:
+                await stream.aclose()
+                logger.warning(f"音声合成キャッシュのストレージからの取得に失敗しました: {e}")
+                TTS_CACHE_REQUESTS.labels(result="error").inc()
+                return None
+            else:
+                TTS_CACHE_REQUESTS.labels(result="hit_s3").inc()
+                return self._chain(first, stream)
+
+        TTS_CACHE_REQUESTS.labels(result="miss").inc()
+        return None
+
+    async def put(self, key: str, audio: bytes) -> None:
+        """合成した音声を保存する（サイズ上限を超える音声は保存しない）"""
+        if not audio:
+            return
+        if len(audio) > settings.TTS_CACHE_MAX_BYTES:
+            TTS_CACHE_SKIPPED.inc()
+            return
+
+        try:
+            redis_client = get_redis_client()
+            if len(audio) <= settings.TTS_CACHE_REDIS_MAX_BYTES:
+                await redis_client.setex(self._redis_key(key), settings.TTS_CACHE_REDIS_TTL, audio)
+                TTS_CACHE_STORES.labels(tier="redis").inc()
+            await self.storage.put_bytes(self._path(key), audio, content_type="audio/mpeg")
+            await redis_client.setex(self._index_key(key), settings.TTS_CACHE_INDEX_TTL, len(audio))
+            TTS_CACHE_STORES.labels(tier="s3").inc()
+        except Exception as e:
+            logger.warning(f"音声合成キャッシュへの保存に失敗しました: {e}")
+
+    @staticmethod
+    async def _iterate(audio: bytes, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        for start in range(0, len(audio), chunk_size):
+            yield audio[start:start + chunk_size]
+
+    @staticmethod
+    async def _chain(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        yield first
+        async for chunk in rest:
+            yield chunk
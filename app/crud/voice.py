@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.aws.polly_client import AsyncPollyClient
+from app.core.config import settings
+from app.core.metrics import Counter
+from app.crud.redis import get_redis_client
+from app.crud.tts_cache import TTSCacheService, tts_cache_key
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_SYNTHESIS = Counter(
+    "tts_speculative_total",
+    "チャットの応答の音声の先行合成の数",
+    labelnames=("result",),
+)
+
+# 文末（句点・感嘆符・疑問符の連続と直後の閉じ括弧）または改行で区切る
+_SENTENCE_PATTERN = re.compile(r".*?(?:[。！？!?]+[」』）)]*|\n+|$)", re.S)
+
+
+def split_sentences(text: str) -> List[str]:
+    """テキストを日本語の文単位に分割する（区切りの記号は直前の文に含める）"""
+    sentences = []
+    for match in _SENTENCE_PATTERN.finditer(text):
+        sentence = match.group().strip()
+        if not sentence:
+            continue
+        # 記号だけの断片は直前の文につなげる
+        if sentences and not re.search(r"[^\s。！？!?」』）)、,]", sentence):
+            sentences[-1] += sentence
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+class SharedAudioStream:
+    """
+    1つの音声合成のストリームを複数のレスポンスで共有する
+    バックグラウンドのタスクがソースを読み進めてチャンクを溜め、購読者はそれぞれ先頭から受け取る
+    購読者が切断してもソースは最後まで読み、完了時にon_completeへ音声全体を渡す
+    """
+
+    def __init__(self, source: AsyncIterator[bytes], on_complete: Optional[Callable[[bytes], Awaitable[None]]] = None):
+        self._chunks: List[bytes] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self.task = asyncio.ensure_future(self._pump(source, on_complete))
+
+    async def _pump(self, source: AsyncIterator[bytes], on_complete: Optional[Callable[[bytes], Awaitable[None]]]) -> None:
+        try:
+            async for chunk in source:
+                async with self._changed:
+                    self._chunks.append(chunk)
+                    self._changed.notify_all()
+        except Exception as e:
+            logger.error(f"音声合成のストリームの読み込みに失敗しました: {e}")
+            self._error = e
+        finally:
+            async with self._changed:
+                self._done = True
+                self._changed.notify_all()
+
+        if self._error is None and on_complete is not None:
+            try:
+                await on_complete(b"".join(self._chunks))
+            except Exception as e:
+                logger.warning(f"合成した音声の後処理に失敗しました: {e}")
+
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        """先頭から順にチャンクを返す（ソースが失敗した場合は、受け取り済みの分の後に例外を送出する）"""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self._chunks) or self._done)
+                chunks = self._chunks[index:]
+                done = self._done
+            index += len(chunks)
+            for chunk in chunks:
+                yield chunk
+            if done and index >= len(self._chunks):
+                if self._error is not None:
+                    raise self._error
+                return
+
+
+# 合成中の音声（キャッシュキー -> ストリーム）。同じテキスト・音声の同時リクエストはPollyの呼び出しを共有する
+_inflight: Dict[str, SharedAudioStream] = {}
+
+# 実行中の先行合成（タスクの参照を保持する）
+_speculative_tasks: Set[asyncio.Task] = set()
+
+
+def _reply_key(reply_id: str) -> str:
+    return f"tts:reply:{reply_id}"
+
+
+async def save_reply_voice(reply_id: str, user_id: int, character_id: int, voice: str, text: str) -> bool:
+    """reply_idに応答のテキストと音声を紐づける（保存できなかった場合はFalse）"""
+    payload = {"user_id": user_id, "character_id": character_id, "voice": voice, "text": text}
+    try:
+        await get_redis_client().setex(_reply_key(reply_id), settings.TTS_REPLY_TTL, json.dumps(payload, ensure_ascii=False))
+        return True
+    except Exception as e:
+        logger.warning(f"応答の音声の紐づけの保存に失敗しました: {e}")
+        return False
+
+
+async def get_reply_voice(reply_id: str) -> Optional[Dict[str, Any]]:
+    """reply_idに紐づく応答のテキストと音声を取得"""
+    try:
+        cached = await get_redis_client().get(_reply_key(reply_id))
+    except Exception as e:
+        logger.warning(f"応答の音声の紐づけの取得に失敗しました: {e}")
+        return None
+    return json.loads(cached) if cached is not None else None
+
+
+class VoiceSynthesisService:
+    """キャッシュ済みの音声があればそれを、なければPollyで合成しながら音声を返すサービス"""
+
+    def __init__(self, polly_client: AsyncPollyClient, tts_cache: TTSCacheService):
+        self.polly_client = polly_client
+        self.tts_cache = tts_cache
+
+    async def stream(self, text: str, voice: str) -> AsyncIterator[bytes]:
+        """音声のチャンクのイテレータを返す（合成した音声は完了後にキャッシュへ保存する）"""
+        key = tts_cache_key(text, voice)
+        if settings.TTS_CACHE_ENABLED:
+            cached = await self.tts_cache.get(key)
+            if cached is not None:
+                return cached
+
+        shared = _inflight.get(key)
+        if shared is None:
+            shared = SharedAudioStream(
+                self.polly_client.synthesize_stream(text, voice),
+                on_complete=(lambda audio: self.tts_cache.put(key, audio)) if settings.TTS_CACHE_ENABLED else None,
+            )
+            _inflight[key] = shared
+            shared.task.add_done_callback(lambda _, key=key, shared=shared: _inflight.pop(key) if _inflight.get(key) is shared else None)
+        return shared.subscribe()
+
+    async def synthesize(self, text: str, voice: str) -> AsyncIterator[bytes]:
+        """設定に応じて文ごとのパイプライン、またはテキスト全体で音声を合成する"""
+        if settings.TTS_SENTENCE_PIPELINE_ENABLED:
+            return await self.stream_sentences(text, voice)
+        return await self.stream(text, voice)
+
+    def speculate(self, text: str, voice: str) -> bool:
+        """
+        音声の合成をバックグラウンドで開始する（結果はキャッシュに保存され、合成中は同じ音声のリクエストと共有される）
+        実行中の先行合成が上限に達している場合は行わずにFalseを返す
+        """
+        if len(_speculative_tasks) >= settings.TTS_SPECULATIVE_MAX_PENDING:
+            SPECULATIVE_SYNTHESIS.labels(result="skipped").inc()
+            return False
+        task = asyncio.ensure_future(self._prefetch(text, voice))
+        _speculative_tasks.add(task)
+        task.add_done_callback(_speculative_tasks.discard)
+        SPECULATIVE_SYNTHESIS.labels(result="scheduled").inc()
+        return True
+
+    async def _prefetch(self, text: str, voice: str) -> None:
+        try:
+            async for _ in await self.synthesize(text, voice):
+                pass
+        except Exception as e:
+            SPECULATIVE_SYNTHESIS.labels(result="failed").inc()
+            logger.warning(f"音声の先行合成に失敗しました: {e}")
+
+    async def stream_sentences(self, text: str, voice: str, concurrency: int = settings.TTS_SENTENCE_CONCURRENCY) -> AsyncIterator[bytes]:
+        """
+        テキストを文ごとに分割し、最大concurrency文を並行して合成しながら、文の順に1つのMP3として返す
+        文ごとの音声はそれぞれキャッシュの対象になる（MP3はフレームの連結でそのまま再生できる）
+        """
+        sentences = split_sentences(text)
+        if len(sentences) <= 1:
+            return await self.stream(text, voice)
+        return self._pipeline(sentences, voice, concurrency)
+
+    async def _pipeline(self, sentences: List[str], voice: str, concurrency: int) -> AsyncIterator[bytes]:
+        semaphore = asyncio.Semaphore(concurrency)
+        queues = [asyncio.Queue() for _ in sentences]
+
+        async def prefetch(sentence: str, queue: asyncio.Queue) -> None:
+            async with semaphore:
+                try:
+                    async for chunk in await self.stream(sentence, voice):
+                        queue.put_nowait(chunk)
+                    queue.put_nowait(None)
+                except Exception as e:
+                    queue.put_nowait(e)
+
+        tasks = [asyncio.ensure_future(prefetch(sentence, queue)) for sentence, queue in zip(sentences, queues)]
+        try:
+            for queue in queues:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+        finally:
+            # クライアントの切断・失敗時は残りの合成の待ちを打ち切る（合成済みの分はキャッシュに保存される）
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel, monitoring
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongo_pool_connections",
+    "MongoDBの接続プールの接続数",
+    labelnames=("address", "state"),
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds",
+    "MongoDBの接続プールから接続を取り出すまでの待ち時間",
+    labelnames=("address",),
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongo_pool_checkout_failures_total",
+    "MongoDBの接続プールから接続を取り出せなかった数",
+    labelnames=("address", "reason"),
+)
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class MongoPoolMetricsListener(monitoring.ConnectionPoolListener):
+    """MongoDBの接続プールのイベントをメトリクスに記録するリスナー"""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(address=_address(event), state="open").inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(address=_address(event), state="open").dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(address=_address(event), reason=str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CONNECTIONS.labels(address=_address(event), state="checked_out").inc()
+        # durationはpymongo 4.7以降のみ
+        duration = getattr(event, "duration", None)
+        if duration is not None:
+            MONGO_POOL_CHECKOUT_WAIT.labels(address=_address(event)).observe(duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CONNECTIONS.labels(address=_address(event), state="checked_out").dec()
+
+
+mongo_pool_listener = MongoPoolMetricsListener()
+
+# クエリのパターンに合わせたインデックス（コレクション名 -> インデックス）
+MONGO_INDEXES = {
+    # チャット履歴の取得・直近のメッセージ・件数の集計
+    "chats": [
+        # 同じtimestampのメッセージは_idで順序を決める（会話分析・要約のウォーターマーク）
+        IndexModel([("user_id", ASCENDING), ("character_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+        # メッセージIDによるチャット履歴のページング
+        IndexModel([("user_id", ASCENDING), ("character_id", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    # 最新のイベントの取得
+    "events": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+    ],
+    # 県ごとの市町村の魅力度の取得
+    "municipality_fascination": [
+        IndexModel([("prefecture_id", ASCENDING)]),
+    ],
+    # 会話ごとの状態（1会話1ドキュメント。初回の保存が並行した場合は一意制約で片方を失敗させる）
+    "conversation_analysis_states": [
+        IndexModel([("user_id", ASCENDING), ("character_id", ASCENDING)], unique=True),
+    ],
+    "chat_summaries": [
+        IndexModel([("user_id", ASCENDING), ("character_id", ASCENDING)], unique=True),
+    ],
+    # ユーザー全体・キャラクターごとのチャットのカウンター
+    "chat_counters": [
+        IndexModel([("user_id", ASCENDING), ("scope", ASCENDING), ("character_id", ASCENDING)], unique=True),
+    ],
+}
+
+# プロセス内で共有するMongoDBクライアント
+_client: Optional[AsyncIOMotorClient] = None
+
+
+def get_mongo_client() -> AsyncIOMotorClient:
+    """共有MongoDBクライアントを取得（未作成なら作成）"""
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            settings.MONGODB_URL,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=settings.MONGODB_SOCKET_TIMEOUT_MS,
+            event_listeners=[mongo_pool_listener],
+        )
+    return _client
+
+
+def get_mongo_database() -> AsyncIOMotorDatabase:
+    """共有MongoDBクライアントのデータベースを取得"""
+    return get_mongo_client()[settings.MONGODB_DB_NAME]
+
+
+async def ensure_indexes(mongodb: AsyncIOMotorDatabase) -> None:
+    """
+    必要なインデックスを作成する（既に存在する場合は何もしない）
+    インデックスを作成できなくてもアプリは起動させる（MongoDBに接続できない場合の待ち時間が重ならないよう並行して作成する）
+    """
+    async def create(collection_name: str, indexes: list) -> None:
+        try:
+            names = await mongodb[collection_name].create_indexes(indexes)
+            logger.info(f"インデックスを確認しました: {collection_name} {names}")
+        except Exception as e:
+            logger.error(f"インデックスの作成に失敗しました: {collection_name}, {e}")
+
+    await asyncio.gather(*(create(name, indexes) for name, indexes in MONGO_INDEXES.items()))
+
+
+async def init_mongo_client() -> None:
+    """共有MongoDBクライアントを作成し、インデックスを作成する（アプリ起動時に呼び出す）"""
+    await ensure_indexes(get_mongo_database())
+
+
+def close_mongo_client() -> None:
+    """共有MongoDBクライアントを閉じる（アプリ終了時に呼び出す）"""
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = None
@@ -1,10 +1,48 @@
+import time
+
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from app.core.config import settings
+from app.core.metrics import Counter, Gauge, Histogram
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "SQLAlchemyの接続プールから接続を取り出すまでの待ち時間（新規接続・pre-pingを含む）",
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total",
+    "SQLAlchemyの接続プールから接続を取り出せずにタイムアウトした数",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "SQLAlchemyの接続プールの接続数",
+    labelnames=("state",),
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """接続の取り出しにかかった時間を記録するQueuePool"""
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True, poolclass=InstrumentedQueuePool)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+DB_POOL_CONNECTIONS.labels(state="checked_out").set_function(lambda: engine.pool.checkedout())
+DB_POOL_CONNECTIONS.labels(state="idle").set_function(lambda: engine.pool.checkedin())
+DB_POOL_CONNECTIONS.labels(state="overflow").set_function(lambda: max(engine.pool.overflow(), 0))
+
+Base = declarative_base()
@@ -9,8 +9,20 @@ from app.schemas.base import BaseInput, BaseOutput
 class ChatMessage(BaseModel):
     """Chat message model"""
 
+    id: Optional[str] = Field(default=None, description="Message ID (cursor for paginated history)")
     role: str = Field(..., description="Role of the message sender (user, assistant)")
     content: str = Field(..., description="Content of the message")
+    timestamp: Optional[str] = Field(default=None, description="Saved time of the message (ISO 8601, UTC)")
+
+
+class ChatMessagePage(BaseModel):
+    """One page of the chat history (messages are in chronological order)"""
+
+    messages: List[ChatMessage] = Field(..., description="Messages in this page, oldest first")
+    has_more: bool = Field(..., description="Whether more messages exist in the paging direction")
+    next_cursor: Optional[str] = Field(
+        default=None, description="Message ID to pass as before/after to get the next page in the same direction"
+    )
 
 
 class ChatInput(BaseInput):
@@ -19,6 +31,14 @@ class ChatInput(BaseInput):
     role: str = Field(..., description="Role of the current message")
     response: str = Field(..., description="Current message content")
     history: List[ChatMessage] = Field(default=[], description="Chat history")
+    use_server_history: bool = Field(
+        default=False,
+        description="Trueの場合、historyは送信不要。サーバーが保存済みの直近の会話履歴を読み込む",
+    )
+    prefetch_voice: bool = Field(
+        default=False,
+        description="Trueの場合、応答の確定後に音声合成をバックグラウンドで開始し、応答にreply_idを含める",
+    )
 
 
 class ChatOutput(BaseOutput):
@@ -29,6 +49,20 @@ class ChatOutput(BaseOutput):
     chunks: Optional[List[Dict]] = Field(
         default=None, description="chunksは、RAG が参照したチャンクの情報です。"
     )
+    reply_id: Optional[str] = Field(
+        default=None, description="音声の先行合成を開始した場合のID。voice_readerにreply_idとして渡す"
+    )
+
+class ChatStreamEvent(BaseModel):
+    """Event schema for the streaming chat endpoint (one NDJSON line per event)"""
+
+    type: str = Field(..., description="Event type (delta, done, error)")
+    content: Optional[str] = Field(default=None, description="Delta content (type=delta)")
+    role: Optional[str] = Field(default=None, description="Role of the response (type=done)")
+    response: Optional[str] = Field(default=None, description="Assembled response content (type=done)")
+    chunks: Optional[List[Dict]] = Field(default=None, description="RAG が参照したチャンクの情報 (type=done)")
+    message: Optional[str] = Field(default=None, description="Error message (type=error)")
+    reply_id: Optional[str] = Field(default=None, description="ID of the speculatively synthesized voice (type=done)")
 
 class ChatCount(BaseModel):
     """Chat count model"""
@@ -44,10 +78,25 @@ class ChatCount(BaseModel):
 class VoiceReaderInput(BaseModel):
     """Input schema for voice chat"""
 
-    text: str = Field(..., description="Text to be converted to speech")
+    text: Optional[str] = Field(default=None, description="Text to be converted to speech (optional when reply_id is given)")
+    reply_id: Optional[str] = Field(
+        default=None, description="reply_id returned by the chat endpoint; serves the speculatively synthesized audio of that reply"
+    )
 
 class ConversationAnalysisChainInput(BaseModel):
     """Input schema for conversation analysis chain"""
 
     user_id: int = Field(..., description="User ID")
-    character_id: int = Field(..., description="Character ID")
\ No newline at end of file
+    character_id: int = Field(..., description="Character ID")
+
+
+class ConversationAnalysisJob(BaseModel):
+    """Conversation analysis job state"""
+
+    job_id: str = Field(..., description="Job ID")
+    character_id: int = Field(..., description="Character ID")
+    status: str = Field(..., description="Job status (queued, running, succeeded, failed)")
+    result: Optional[Dict] = Field(default=None, description="Analysis result (status=succeeded)")
+    error: Optional[str] = Field(default=None, description="Error message (status=failed)")
+    created_at: datetime = Field(..., description="Time the job was submitted")
+    updated_at: datetime = Field(..., description="Time the job state was last updated")
@@ -1,18 +1,49 @@
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router
+from app.api.v1.endpoints import metrics
+from app.core.aws.polly_client import polly_client
 from app.core.config import settings
+from app.core.llm.core.langchain_tasuki import close_http_client
+from app.core.llm.registry import llm_registry
+from app.core.middleware import MetricsMiddleware
+from app.crud.analysis_jobs import analysis_jobs
+from app.crud.chat_writer import chat_message_writer
+from app.crud.redis import close_redis_client
+from app.db.mongo import close_mongo_client, init_mongo_client
 
 if os.getenv("OPENAPI_URL"):
     openapi_url = os.getenv("OPENAPI_URL")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """アプリケーションの起動・終了時の処理"""
+    await init_mongo_client()
+    await polly_client.start()
+    await chat_message_writer.start()
+    await analysis_jobs.start()
+    yield
+    # 処理待ちの会話分析ジョブと未書き込みのチャットメッセージを処理してから接続を閉じる
+    await analysis_jobs.stop()
+    await chat_message_writer.stop()
+    close_mongo_client()
+    await close_redis_client()
+    await polly_client.close()
+    # 共有LLMモデル・チェーンを破棄し、HTTP接続プールを閉じる
+    llm_registry.clear()
+    await close_http_client()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version="1.0.0",
     openapi_url=settings.OPENAPI_URL+"/openapi.json",
+    lifespan=lifespan,
 )
 
 origins = []
@@ -28,4 +59,8 @@ app.add_middleware(
     allow_headers=["*"],       # Allow all headers
 )
 
-app.include_router(api_router, prefix=settings.API_V1_STR)
\ No newline at end of file
+app.add_middleware(MetricsMiddleware)
+
+app.include_router(api_router, prefix=settings.API_V1_STR)
+# Prometheusのスクレイプ用（APIのプレフィックスの外に置く）
+app.include_router(metrics.router)
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+負荷試験用のローカルの代替実装
+TASUKI（HTTPサーバー）・Bedrock・Polly・S3・MongoDB・Redisを、課金APIや外部サービスなしで動かすための偽物
+"""
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import fakeredis
+import fakeredis.aioredis
+import redis.asyncio
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core.llm.core.fake import FakeChatModel
+
+
+@dataclass
+class LatencyProfile:
+    """
+    偽の外部APIの応答時間と失敗率
+    応答時間は中央値median秒・形状sigmaの対数正規分布に従う
+    """
+
+    median: float = 0.5
+    sigma: float = 0.4
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.sigma)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class ProfiledFakeChatModel(FakeChatModel):
+    """呼び出しごとにLatencyProfileから応答時間を引く偽のチャットモデル（Bedrockの代わり）"""
+
+    profile: Any = None
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.profile.sample())
+        if self.profile.should_fail():
+            raise RuntimeError("fake Bedrock error")
+        return self._to_chat_result(self._respond(self._build_prompt(messages)))
+
+
+def create_fake_tasuki_app(profile: LatencyProfile) -> FastAPI:
+    """TASUKIの /project/{project_id}/ragchat と /auth_check を模擬するアプリ"""
+    app = FastAPI()
+
+    @app.get("/auth_check")
+    async def auth_check():
+        return {"status_code": "200", "message": "ok"}
+
+    @app.post("/project/{project_id}/ragchat")
+    async def ragchat(project_id: str, request: Request):
+        payload = await request.json()
+        prompt = "\n".join(message.get("content", "") for message in payload.get("messages", []))
+        content = FakeChatModel._respond(prompt)
+        latency = profile.sample()
+
+        if profile.should_fail():
+            await asyncio.sleep(latency)
+            return JSONResponse(status_code=profile.error_status, content={"detail": "fake TASUKI error"})
+
+        if not payload.get("stream"):
+            await asyncio.sleep(latency)
+            return {"choices": [{"delta": {"content": content}}], "chunks": []}
+
+        # 最初のトークンまでに応答時間の3割、残りをチャンクごとに均等に待つ
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)] or [""]
+
+        async def events():
+            await asyncio.sleep(latency * 0.3)
+            for piece in pieces:
+                yield "data: " + json.dumps({"choices": [{"delta": {"content": piece}}]}, ensure_ascii=False) + "\n\n"
+                await asyncio.sleep(latency * 0.7 / len(pieces))
+            yield "data: " + json.dumps({"choices": [{"delta": {}}], "chunks": []}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class BackgroundServer:
+    """uvicornのサーバーを別スレッド（別イベントループ）で起動する"""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0, lifespan: str = "off"):
+        self.config = uvicorn.Config(app, host=host, port=port, lifespan=lifespan, log_level="warning", access_log=False)
+        self.server = uvicorn.Server(self.config)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        sockets = self.server.servers[0].sockets
+        host, port = sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, timeout: float = 30.0) -> None:
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("サーバーの起動に失敗しました")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+
+class FakePollyClient:
+    """AsyncPollyClient の synthesize_stream を模擬するクライアント（無音に近いダミーのMP3バイト列を返す）"""
+
+    def __init__(self, profile: LatencyProfile, bytes_per_char: int = 400, chunk_size: int = 8 * 1024):
+        self.profile = profile
+        self.bytes_per_char = bytes_per_char
+        self.chunk_size = chunk_size
+
+    async def synthesize_stream(self, text: str, voice_id: str, **kwargs) -> AsyncIterator[bytes]:
+        # 最初のチャンクまでに応答時間の半分、残りをチャンクごとに均等に待つ
+        latency = self.profile.sample()
+        await asyncio.sleep(latency / 2)
+        if self.profile.should_fail():
+            raise RuntimeError("fake Polly error")
+        audio = b"ID3" + bytes(max(1, len(text)) * self.bytes_per_char)
+        chunks = [audio[i:i + self.chunk_size] for i in range(0, len(audio), self.chunk_size)]
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(latency / 2 / len(chunks))
+
+
+class InMemoryStorageService:
+    """StorageService（S3/MinIO）と同じインターフェースを持つメモリ上のストレージ"""
+
+    def __init__(self, profile: Optional[LatencyProfile] = None):
+        self.profile = profile or LatencyProfile(median=0.0)
+        self.objects: Dict[str, bytes] = {}
+
+    def put(self, path: str, data: bytes) -> None:
+        self.objects[path] = data
+
+    async def upload_file(self, file, path: str, content_type: Optional[str] = None) -> str:
+        await asyncio.sleep(self.profile.sample())
+        self.objects[path] = await file.read()
+        return f"memory://{path}"
+
+    async def download_file(self, path: str) -> bytes:
+        await asyncio.sleep(self.profile.sample())
+        if path not in self.objects:
+            raise FileNotFoundError(path)
+        return self.objects[path]
+
+    async def put_bytes(self, path: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        await asyncio.sleep(self.profile.sample())
+        self.objects[path] = data
+
+    async def stream_file(self, path: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        await asyncio.sleep(self.profile.sample())
+        if path not in self.objects:
+            raise FileNotFoundError(path)
+        data = self.objects[path]
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def list_files(self, prefix: str = "") -> List[dict]:
+        return [{"key": key, "size": len(data)} for key, data in self.objects.items() if key.startswith(prefix)]
+
+
+def install_fake_redis() -> fakeredis.FakeServer:
+    """redis.asyncio.from_url をプロセス内で共有する偽のRedisに差し替える"""
+    server = fakeredis.FakeServer()
+
+    def from_url(url, **kwargs):
+        kwargs.pop("encoding", None)
+        return fakeredis.aioredis.FakeRedis(server=server, **kwargs)
+
+    redis.asyncio.from_url = from_url
+    return server
+
+
+def create_fake_mongo_client() -> AsyncMongoMockClient:
+    return AsyncMongoMockClient()
@@ -0,0 +1,92 @@
+"""負荷試験の計測結果の集計・表示・ベースラインとの比較"""
+import json
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """最近接順位法によるパーセンタイル"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@dataclass
+class Recorder:
+    """エンドポイントごとのレイテンシとエラー数を記録する"""
+
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def record(self, name: str, seconds: float, ok: bool) -> None:
+        self.latencies[name].append(seconds)
+        if not ok:
+            self.errors[name] += 1
+
+    def summarize(self, elapsed: float) -> Dict[str, dict]:
+        summary = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            summary[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "throughput": len(values) / elapsed if elapsed > 0 else 0.0,
+                **{f"p{q}": percentile(values, q) for q in PERCENTILES},
+                "max": values[-1],
+            }
+        return summary
+
+
+def print_summary(summary: Dict[str, dict], elapsed: float) -> None:
+    header = f"{'endpoint':<24}{'count':>8}{'errors':>8}{'req/s':>9}" + "".join(f"{f'p{q}(ms)':>11}" for q in PERCENTILES) + f"{'max(ms)':>11}"
+    print(f"経過時間: {elapsed:.1f}秒")
+    print(header)
+    print("-" * len(header))
+    for name, row in summary.items():
+        print(
+            f"{name:<24}{row['count']:>8}{row['errors']:>8}{row['throughput']:>9.2f}"
+            + "".join(f"{row[f'p{q}'] * 1000:>11.1f}" for q in PERCENTILES)
+            + f"{row['max'] * 1000:>11.1f}"
+        )
+
+
+def save_baseline(path: str, summary: Dict[str, dict], options: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"options": options, "endpoints": summary}, f, ensure_ascii=False, indent=2)
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def compare_with_baseline(summary: Dict[str, dict], baseline: dict, max_regression: float, metric: str = "p95") -> List[str]:
+    """
+    ベースラインと比較し、metricがmax_regression（割合）を超えて悪化したエンドポイント、
+    またはエラー率が悪化したエンドポイントを返す
+    """
+    regressions = []
+    print(f"\nベースラインとの比較（{metric}）:")
+    for name, row in summary.items():
+        base = baseline.get("endpoints", {}).get(name)
+        if base is None:
+            print(f"  {name:<24} ベースラインなし")
+            continue
+        current, previous = row[metric], base[metric]
+        change = (current - previous) / previous if previous > 0 else 0.0
+        error_rate = row["errors"] / row["count"] if row["count"] else 0.0
+        base_error_rate = base["errors"] / base["count"] if base["count"] else 0.0
+        marker = ""
+        if change > max_regression or error_rate > base_error_rate + 0.01:
+            marker = "  <-- 悪化"
+            regressions.append(name)
+        print(f"  {name:<24} {previous * 1000:>9.1f}ms -> {current * 1000:>9.1f}ms ({change:+.1%}){marker}")
+    return regressions
@@ -0,0 +1,73 @@
+"""
+負荷試験用のPostgreSQLのデータ投入
+既存のデータを壊さないよう、負荷試験用のユーザー・キャラクター・NFC UUIDだけを冪等に作成する
+"""
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.security import get_password_hash
+from app.db.base import Base
+from app.models.character import Character
+from app.models.nfc import CharacterNfcUuid
+from app.models.relationship import LevelThreshold, TrustLevel
+from app.models.user import Users
+
+LOADTEST_PASSWORD = "loadtest-password"
+LOADTEST_PROJECT_ID = "loadtest-project"
+
+
+@dataclass
+class SeededUser:
+    email: str
+    password: str
+
+
+@dataclass
+class SeededCharacter:
+    id: int
+    nfc_uuid: str
+
+
+def seed_database(db: Session, users: int, characters: int) -> Tuple[List[SeededUser], List[SeededCharacter]]:
+    """負荷試験用のユーザーとキャラクターを作成し、作成済みであれば再利用する"""
+    Base.metadata.create_all(bind=db.get_bind())
+
+    if db.query(TrustLevel).filter(TrustLevel.id == 1).first() is None:
+        db.add(TrustLevel(id=1, name="知り合い"))
+        db.commit()
+
+    # bcryptのハッシュ化は重いため全ユーザーで同じハッシュを使う
+    hashed_password = get_password_hash(LOADTEST_PASSWORD)
+    seeded_users = []
+    for i in range(users):
+        email = f"loadtest-{i}@example.com"
+        if db.query(Users).filter(Users.email == email).first() is None:
+            db.add(Users(name=f"loadtest-{i}", email=email, hashed_password=hashed_password, is_active=True))
+        seeded_users.append(SeededUser(email=email, password=LOADTEST_PASSWORD))
+    db.commit()
+
+    seeded_characters = []
+    for i in range(characters):
+        nfc_uuid = f"loadtest-nfc-{i}"
+        character = db.query(Character).join(CharacterNfcUuid).filter(CharacterNfcUuid.nfc_uuid == nfc_uuid).first()
+        if character is None:
+            character = Character(
+                name=f"負荷試験キャラクター{i}",
+                age=20,
+                gender=i % 2,
+                personality=["明るい"],
+                hobbies=["散歩"],
+                specialties=["会津の歴史"],
+                introduction="負荷試験用のキャラクターです。",
+                tasuki_project_id=LOADTEST_PROJECT_ID,
+            )
+            db.add(character)
+            db.flush()
+            db.add(CharacterNfcUuid(character_id=character.id, nfc_uuid=nfc_uuid))
+            db.add(LevelThreshold(character_id=character.id, trust_level_id=1, required_points=100))
+        seeded_characters.append(SeededCharacter(id=character.id, nfc_uuid=nfc_uuid))
+    db.commit()
+
+    return seeded_users, seeded_characters